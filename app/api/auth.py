@@ -1,59 +1,151 @@
-from app.core.exceptions import BadRequestException, ForbiddenException, UnauthorizedException
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+import hmac
+
+from app.core.exceptions import (
+    BadRequestException, ForbiddenException, ServiceUnavailableException, UnauthorizedException
+)
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, schemas
 from app.core import security
+from app.core.admission import auth_admission, introspect_admission
+from app.core.config import settings
 from app.core.database import get_db
+from app.core.hashing import HashingOverloaded
+from app.core.revocation import revocation_list
 
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
+optional_security = HTTPBearer(auto_error=False)
+
+
+def client_ip(request: Request) -> str | None:
+    return request.client.host if request.client else None
+
+
+def is_gateway_key(key: Optional[str]) -> bool:
+    """Ключ совпадает с одним из INTROSPECT_GATEWAY_KEYS"""
+    if not key:
+        return False
+    return any(
+        hmac.compare_digest(key.encode(), known.encode()) for known in settings.INTROSPECT_GATEWAY_KEYS
+    )
+
 
 @router.post("/register", response_model=schemas.AccessToken)
 async def register(
     form_data: schemas.UserCreate,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     # ToDo Что, если пользователь удалился и хочет восстановиться?
     try:
-        # Создаем пользователя
-        user = await crud.user.create(db, user_data=form_data)
+        async with auth_admission.admit(client_ip(request), form_data.email):
+            # Создаем пользователя
+            user = await crud.user.create(db, user_data=form_data)
 
-        # Создаем токен
-        access_token = security.create_access_token(user)
+            # Создаем токен
+            access_token = security.create_access_token(user)
 
-        return schemas.AccessToken(access_token=access_token)
+            return schemas.AccessToken(access_token=access_token)
 
     except ValueError as e:
         raise BadRequestException(detail=str(e))
+    except HashingOverloaded as e:
+        raise ServiceUnavailableException(detail=str(e))
 
 
 @router.post("/login", response_model=schemas.AccessToken)
 async def login(
     form_data: schemas.UserLogin,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        user = await crud.user.authenticate(
-            db, email=form_data.email, password=form_data.password
-        )
-        if not user:
-            raise UnauthorizedException(detail="Не корректный Email или пароль")
-        if not user.is_active:
-            raise BadRequestException(detail="Пользователь удален")
+        async with auth_admission.admit(client_ip(request), form_data.email):
+            user = await crud.user.authenticate(
+                db, email=form_data.email, password=form_data.password
+            )
+            if not user:
+                raise UnauthorizedException(detail="Не корректный Email или пароль")
+            if not user.is_active:
+                raise BadRequestException(detail="Пользователь удален")
 
-        # Создаем токен
-        access_token = security.create_access_token(user)
+            # Создаем токен
+            access_token = security.create_access_token(user)
 
-        return schemas.AccessToken(access_token=access_token)
+            return schemas.AccessToken(access_token=access_token)
 
     except ValueError as e:
         raise BadRequestException(detail=str(e))
+    except HashingOverloaded as e:
+        raise ServiceUnavailableException(detail=str(e))
 
 
 @router.post("/logout")
-async def logout():
+async def logout(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_db)
+):
     """Выход пользователя"""
-    # Выход реализуется на клиенте (удалить Access Token)
+    # Клиент удаляет Access Token, переданный токен дополнительно отзывается
+    if credentials is not None:
+        payload = security.verify_token(credentials.credentials)
+        if payload.get("jti") and payload.get("exp"):
+            await crud.token.revoke(db, jti=payload["jti"], expires_at=payload["exp"])
+            revocation_list.add(payload["jti"], payload["exp"])
+
     return {'message': 'Выход из системы пройден успешно'}
+
+
+@router.post("/introspect", response_model=schemas.IntrospectResponse)
+async def introspect(
+    form_data: schemas.IntrospectRequest,
+    request: Request,
+    gateway_key: Optional[str] = Header(None, alias="X-Gateway-Key"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Пакетная проверка токенов для API шлюзов"""
+    # Допуск до проверки ключа ограничивает и перебор ключей
+    async with introspect_admission.admit(client_ip(request), None):
+        if not is_gateway_key(gateway_key):
+            raise UnauthorizedException(detail="Неверный ключ API шлюза")
+
+        return await _introspect_tokens(db, form_data.tokens)
+
+
+async def _introspect_tokens(db: AsyncSession, tokens: List[str]) -> schemas.IntrospectResponse:
+    await revocation_list.sync(db)
+
+    payloads = []
+    for token in tokens:
+        payload = security.verify_token(token)
+        sub = str(payload.get("sub", ""))
+        if not sub.isdigit() or revocation_list.is_revoked(payload.get("jti")):
+            payload = {}
+        payloads.append(payload)
+
+    # Пользователи всех токенов загружаются одним запросом
+    users = await crud.user.get_principals(db, {int(p["sub"]) for p in payloads if p})
+
+    results = []
+    for payload in payloads:
+        user = users.get(int(payload["sub"])) if payload else None
+        if user is None or not user[2]:
+            results.append(schemas.TokenInfo(active=False))
+            continue
+
+        role_id, role_code, _ = user
+        results.append(schemas.TokenInfo(
+            active=True,
+            sub=payload["sub"],
+            role_id=role_id,
+            role=role_code,
+            exp=payload.get("exp"),
+            jti=payload.get("jti"),
+        ))
+
+    return schemas.IntrospectResponse(tokens=results)
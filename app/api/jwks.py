@@ -0,0 +1,25 @@
+import hashlib
+import json
+
+from fastapi import APIRouter, Request, Response
+
+from app.core.config import settings
+from app.core.keys import key_ring
+
+
+router = APIRouter(tags=["jwks"])
+
+
+@router.get("/.well-known/jwks.json")
+async def jwks(request: Request):
+    """Открытые ключи для локальной проверки токенов другими сервисами"""
+    body = json.dumps(key_ring.jwks(), separators=(',', ':'), sort_keys=True)
+    etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+    headers = {
+        'Cache-Control': f'public, max-age={settings.JWT_JWKS_MAX_AGE}',
+        'ETag': etag,
+    }
+
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.exceptions import ForbiddenException, NotFoundException
 from app.core.permissions import PermissionChecker
+from app.core.principal import Principal
 from app import crud, dependencies, models
 
 
@@ -12,8 +13,8 @@ router = APIRouter(prefix="/api/order", tags=["order"])
 
 @router.get("/")
 async def get_all(
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
 ):
     # Проверка прав доступа
     checker = PermissionChecker(db, current_user, 'orders', 'read')
@@ -31,8 +32,8 @@ async def get_all(
 @router.get("/{order_id}")
 async def get_order(
     order_id:int,
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     order = await crud.order.get(db, order_id)
     if not order:
@@ -49,7 +50,7 @@ async def get_order(
 @router.post("/")
 async def create_order(
     form_data: dict,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     # Проверка прав доступа
@@ -67,40 +68,43 @@ async def create_order(
 async def update_order(
     order_id:int,
     form_data: dict,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    order = await crud.order.get(db, order_id)
-    if not order:
-        raise NotFoundException(detail="Заказ не найден")
-
-    # Проверка прав доступа
-    checker = PermissionChecker(db, current_user, 'orders', 'update', order)
-    if not await checker.check_permission():
-        raise ForbiddenException(detail='Нет разрешения на изменение этого заказа')
+    # Права доступа проверяются условием в WHERE того же UPDATE
+    checker = PermissionChecker(db, current_user, 'orders', 'update')
+    scope = await checker.get_scope_clause(models.Order)
 
     # Логика обновления
-    order = await crud.order.update(db, order_id=order_id, update_data=form_data)
+    order = await crud.order.update(db, order_id=order_id, update_data=form_data, scope=scope)
 
+    # Ни одной строки: объекта нет или он не прошел проверку прав
+    if not order:
+        if not await crud.order.exists(db, order_id):
+            raise NotFoundException(detail="Заказ не найден")
+        checker.record_decision(False)
+        raise ForbiddenException(detail='Нет разрешения на изменение этого заказа')
+
+    checker.record_decision(True)
     return order
 
 
 @router.delete("/{order_id}")
 async def delete_order(
     order_id:int,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    order = await crud.order.get(db, order_id)
-    if not order:
-        raise NotFoundException(detail="Заказ не найден")
-
-    # Проверка прав доступа
-    checker = PermissionChecker(db, current_user, 'orders', 'delete', order)
-    if not await checker.check_permission():
-        raise ForbiddenException(detail='Нет разрешения на удаление этого заказа')
+    # Права доступа проверяются условием в WHERE того же DELETE
+    checker = PermissionChecker(db, current_user, 'orders', 'delete')
+    scope = await checker.get_scope_clause(models.Order)
 
     # Логика удаления
-    await crud.order.delete(db, order_id=order_id)
+    if not await crud.order.delete(db, order_id=order_id, scope=scope):
+        if not await crud.order.exists(db, order_id):
+            raise NotFoundException(detail="Заказ не найден")
+        checker.record_decision(False)
+        raise ForbiddenException(detail='Нет разрешения на удаление этого заказа')
 
+    checker.record_decision(True)
     return {'message': 'Заказ удален'}
@@ -4,10 +4,11 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, schemas
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.exceptions import BadRequestException, ForbiddenException, NotFoundException
 from app.core.permissions import PermissionChecker
-from app import dependencies, models
+from app.core.principal import Principal
+from app import dependencies
 
 
 router = APIRouter(prefix="/api/permission", tags=["permission"])
@@ -19,8 +20,8 @@ router = APIRouter(prefix="/api/permission", tags=["permission"])
 
 @router.get("/rules", response_model=List[schemas.RuleResponse])
 async def get_all_rules(
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100,
     role_id: Optional[int] = None,
@@ -51,8 +52,8 @@ async def get_all_rules(
 @router.get("/rules/{rule_id}", response_model=schemas.RuleResponse)
 async def get_rule(
     rule_id: int,
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ) -> schemas.RuleResponse:
     """Получить детальную информацию о правиле доступа"""
     # Получаем правило
@@ -71,7 +72,7 @@ async def get_rule(
 @router.post("/rules", response_model=schemas.RuleResponse)
 async def create_rule(
     form_data: schemas.RuleCreate,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ) -> schemas.RuleResponse:
     """
@@ -100,7 +101,7 @@ async def create_rule(
 async def update_rule(
     rule_id: int,
     form_data: schemas.RuleUpdate,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ) -> schemas.RuleResponse:
     """
@@ -120,8 +121,11 @@ async def update_rule(
     if not await checker.check_permission():
         raise ForbiddenException(detail='Нет разрешения на обновление этого правила')
 
-    # Обновляем правило
-    updated_rule = await crud.permission.update_rule(db, id=rule_id, rule_data=form_data)
+    try:
+        # Обновляем правило
+        updated_rule = await crud.permission.update_rule(db, id=rule_id, rule_data=form_data)
+    except ValueError as e:
+        raise BadRequestException(detail=str(e))
 
     if not updated_rule:
         raise NotFoundException(detail=f"Правило с ID {rule_id} не найдено после обновления")
@@ -132,7 +136,7 @@ async def update_rule(
 @router.delete("/rules/{rule_id}")
 async def delete_rule(
     rule_id: int,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Удалить правило доступа"""
@@ -158,8 +162,8 @@ async def delete_rule(
 @router.get("/roles/{role_id}/rules", response_model=List[schemas.RuleResponse])
 async def get_role_permissions(
     role_id: int,
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100
 ) -> List[schemas.RuleResponse]:
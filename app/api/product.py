@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.exceptions import ForbiddenException, NotFoundException
 from app.core.permissions import PermissionChecker
+from app.core.principal import Principal
 from app import crud, dependencies, models
 
 
@@ -12,8 +13,8 @@ router = APIRouter(prefix="/api/product", tags=["product"])
 
 @router.get("/")
 async def get_all(
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
 ):
     # Проверка прав доступа
     checker = PermissionChecker(db, current_user, 'products', 'read')
@@ -31,8 +32,8 @@ async def get_all(
 @router.get("/{product_id}")
 async def get_product(
     product_id:int,
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     product = await crud.product.get(db, product_id)
     if not product:
@@ -49,7 +50,7 @@ async def get_product(
 @router.post("/")
 async def create_product(
     form_data: dict,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     # Проверка прав доступа
@@ -67,40 +68,43 @@ async def create_product(
 async def update_product(
     product_id:int,
     form_data: dict,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    product = await crud.product.get(db, product_id)
-    if not product:
-        raise NotFoundException(detail="Товар не найден")
-
-    # Проверка прав доступа
-    checker = PermissionChecker(db, current_user, 'products', 'update', product)
-    if not await checker.check_permission():
-        raise ForbiddenException(detail='Нет разрешения на изменение этого товара')
+    # Права доступа проверяются условием в WHERE того же UPDATE
+    checker = PermissionChecker(db, current_user, 'products', 'update')
+    scope = await checker.get_scope_clause(models.Product)
 
     # Логика обновления
-    product = await crud.product.update(db, product_id=product_id, update_data=form_data)
+    product = await crud.product.update(db, product_id=product_id, update_data=form_data, scope=scope)
 
+    # Ни одной строки: объекта нет или он не прошел проверку прав
+    if not product:
+        if not await crud.product.exists(db, product_id):
+            raise NotFoundException(detail="Товар не найден")
+        checker.record_decision(False)
+        raise ForbiddenException(detail='Нет разрешения на изменение этого товара')
+
+    checker.record_decision(True)
     return product
 
 
 @router.delete("/{product_id}")
 async def delete_product(
     product_id:int,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    product = await crud.product.get(db, product_id)
-    if not product:
-        raise NotFoundException(detail="Товар не найден")
-
-    # Проверка прав доступа
-    checker = PermissionChecker(db, current_user, 'products', 'delete', product)
-    if not await checker.check_permission():
-        raise ForbiddenException(detail='Нет разрешения на удаление этого товара')
+    # Права доступа проверяются условием в WHERE того же DELETE
+    checker = PermissionChecker(db, current_user, 'products', 'delete')
+    scope = await checker.get_scope_clause(models.Product)
 
     # Логика удаления
-    await crud.product.delete(db, product_id=product_id)
+    if not await crud.product.delete(db, product_id=product_id, scope=scope):
+        if not await crud.product.exists(db, product_id):
+            raise NotFoundException(detail="Товар не найден")
+        checker.record_decision(False)
+        raise ForbiddenException(detail='Нет разрешения на удаление этого товара')
 
+    checker.record_decision(True)
     return {'message': 'Товар удален'}
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import dependencies
+from app.core import security
+from app.core.database import engine, get_db, pool_stats
+from app.core.exceptions import ForbiddenException
+from app.core.hashing import password_hasher
+from app.core.permissions import PermissionChecker, decision_cache
+from app.core.principal import Principal, principal_cache
+
+
+router = APIRouter(prefix="/api/system", tags=["system"])
+
+
+@router.get("/stats")
+async def get_stats(
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Метрики пула соединений, хэширования паролей и кэшей"""
+    # Проверка прав доступа
+    checker = PermissionChecker(db, current_user, 'system', 'read')
+    if not await checker.check_permission():
+        raise ForbiddenException(detail='Нет разрешения на чтение метрик')
+
+    return {
+        'db_pool': pool_stats(engine),
+        'password_hasher': password_hasher.stats(),
+        'decision_cache': decision_cache.stats(),
+        'principal_cache': principal_cache.stats(),
+        'token_cache': security.token_cache.stats(),
+    }
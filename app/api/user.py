@@ -4,9 +4,11 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud, schemas
-from app.core.database import get_db
-from app.core.exceptions import ForbiddenException, NotFoundException
+from app.core.database import get_db, get_read_db
+from app.core.exceptions import ForbiddenException, NotFoundException, ServiceUnavailableException
+from app.core.hashing import HashingOverloaded
 from app.core.permissions import PermissionChecker
+from app.core.principal import Principal
 from app import dependencies, models
 
 
@@ -15,8 +17,8 @@ router = APIRouter(prefix="/api/user", tags=["user"])
 
 @router.get("/", response_model=List[schemas.UserResponse])
 async def get_all(
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db),
     skip: int = 0,
     limit: int = 100,
 ) -> List[schemas.UserResponse]:
@@ -38,8 +40,8 @@ async def get_all(
 @router.get("/{user_id}", response_model=schemas.UserResponse)
 async def get_profile(
     user_id:int,
-    current_user: models.User = Depends(dependencies.get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(dependencies.get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ) -> schemas.UserResponse:
     user = await crud.user.get(db, user_id=user_id)
     if not user:
@@ -57,38 +59,44 @@ async def get_profile(
 async def update_profile(
     user_id:int,
     form_data: schemas.UserUpdate,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ) -> schemas.UserResponse:
-    user = await crud.user.get(db, user_id=user_id)
-    if not user:
-        raise NotFoundException(detail="Пользователь не найден")
+    # Права доступа проверяются условием в WHERE того же UPDATE
+    checker = PermissionChecker(db, current_user, 'users', 'update')
+    scope = await checker.get_scope_clause(models.User)
 
-    # Проверка прав доступа
-    checker = PermissionChecker(db, current_user, 'users', 'update', user)
-    if not await checker.check_permission():
-        raise ForbiddenException(detail='Нет разрешения на изменение этого пользователя')
+    try:
+        user = await crud.user.update(db, user_id=user_id, update_data=form_data, scope=scope)
+    except HashingOverloaded as e:
+        raise ServiceUnavailableException(detail=str(e))
 
-    user = await crud.user.update(db, user_id=user_id, update_data=form_data)
+    # Ни одной строки: пользователя нет или он не прошел проверку прав
+    if not user:
+        if not await crud.user.exists(db, user_id=user_id):
+            raise NotFoundException(detail="Пользователь не найден")
+        checker.record_decision(False)
+        raise ForbiddenException(detail='Нет разрешения на изменение этого пользователя')
 
+    checker.record_decision(True)
     return user
 
 
 @router.delete("/{user_id}")
 async def delete_profile(
     user_id:int,
-    current_user: models.User = Depends(dependencies.get_current_user),
+    current_user: Principal = Depends(dependencies.get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    user = await crud.user.get(db, user_id=user_id)
-    if not user:
-        raise NotFoundException(detail="Пользователь не найден")
-
-    # Проверка прав доступа
-    checker = PermissionChecker(db, current_user, 'users', 'delete', user)
-    if not await checker.check_permission():
+    # Права доступа проверяются условием в WHERE того же UPDATE
+    checker = PermissionChecker(db, current_user, 'users', 'delete')
+    scope = await checker.get_scope_clause(models.User)
+
+    if not await crud.user.soft_delete(db, user_id=user_id, scope=scope):
+        if not await crud.user.exists(db, user_id=user_id):
+            raise NotFoundException(detail="Пользователь не найден")
+        checker.record_decision(False)
         raise ForbiddenException(detail='Нет разрешения на удаление этого пользователя')
 
-    await crud.user.soft_delete(db, user_id=user_id)
-
+    checker.record_decision(True)
     return {'message': 'Пользователь удален'}
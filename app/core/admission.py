@@ -0,0 +1,100 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable, Optional
+import math
+import time
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.exceptions import ServiceUnavailableException, TooManyRequestsException
+
+
+class TokenBucket:
+    """Token bucket по ключу, состояние хранится в LRU кэше"""
+
+    def __init__(self, rate_per_minute: float, burst: int, maxsize: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        # Полностью восстановленное ведро можно не хранить
+        ttl = burst / self.rate if self.rate > 0 else 0
+        self._buckets = TTLCache(maxsize, ttl)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.burst > 0
+
+    def acquire(self, key: Hashable) -> float:
+        """Забирает токен, возвращает 0 или время до появления токена"""
+        if not self.enabled:
+            return 0
+
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens < 1:
+            self._buckets.set(key, (tokens, now))
+            return (1 - tokens) / self.rate
+
+        self._buckets.set(key, (tokens - 1, now))
+        return 0
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+
+class AdmissionControl:
+    """Допуск запросов к дорогим по CPU эндпоинтам аутентификации"""
+
+    def __init__(
+        self,
+        ip_bucket: TokenBucket,
+        email_bucket: TokenBucket,
+        max_in_flight: int,
+        retry_after: int = 1
+    ):
+        self.ip_bucket = ip_bucket
+        self.email_bucket = email_bucket
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def admit(self, ip: Optional[str], email: Optional[str]) -> AsyncIterator[None]:
+        # Мощность хэширования уже занята - отказываем сразу
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            raise ServiceUnavailableException(
+                detail='Слишком много одновременных запросов', retry_after=self.retry_after
+            )
+
+        for bucket, key in ((self.ip_bucket, ip), (self.email_bucket, email)):
+            if key is None:
+                continue
+            wait = bucket.acquire(key.lower())
+            if wait:
+                raise TooManyRequestsException(retry_after=math.ceil(wait))
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    def reset(self) -> None:
+        self.ip_bucket.reset()
+        self.email_bucket.reset()
+        self.in_flight = 0
+
+
+auth_admission = AdmissionControl(
+    TokenBucket(settings.AUTH_IP_RATE_PER_MINUTE, settings.AUTH_IP_BURST, settings.AUTH_ADMISSION_KEYS),
+    TokenBucket(settings.AUTH_EMAIL_RATE_PER_MINUTE, settings.AUTH_EMAIL_BURST, settings.AUTH_ADMISSION_KEYS),
+    settings.AUTH_MAX_IN_FLIGHT,
+)
+
+# Допуск к introspect: каждый токен проверяется по подписи, поэтому
+# нагрузка шлюзов ограничивается отдельно от login и register
+introspect_admission = AdmissionControl(
+    TokenBucket(settings.INTROSPECT_RATE_PER_MINUTE, settings.INTROSPECT_BURST, settings.AUTH_ADMISSION_KEYS),
+    TokenBucket(0, 0, 0),
+    settings.INTROSPECT_MAX_IN_FLIGHT,
+)
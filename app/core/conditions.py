@@ -0,0 +1,224 @@
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import and_, false, or_, true
+from sqlalchemy.sql.elements import ColumnElement
+
+
+# Условия правил доступа (RolePermissionResource.conditions)
+#
+# Формат: {"<поле>": <значение>}
+#   {"status": "pending"}                 - равенство
+#   {"status": ["active", "pending"]}     - вхождение в список
+#   {"min_price": 100}, {"max_price": 500} - нижняя/верхняя граница (включительно)
+#   {"price": {"gte": 100, "lt": 500}}    - явные операторы
+#
+# Операторы: eq, in, not_in, gt, gte, lt, lte, range ([от, до] включительно)
+
+OPERATORS = ('eq', 'in', 'not_in', 'gt', 'gte', 'lt', 'lte', 'range')
+
+_PREFIX_OPERATORS = (('min_', 'gte'), ('max_', 'lte'))
+
+# Нормализованное условие: (поле, оператор, аргумент)
+Clause = Tuple[str, str, Any]
+
+_MISSING = object()
+
+
+class CompiledConditions:
+    """Условия правила, скомпилированные в предикат"""
+
+    __slots__ = ('clauses', 'fields', 'deny', 'check')
+
+    def __init__(self, clauses: Tuple[Clause, ...], deny: bool = False):
+        self.clauses = clauses
+        self.fields = tuple(dict.fromkeys(field for field, _, _ in clauses))
+        self.deny = deny
+        self.check: Callable[[Any], bool] = _deny if deny else _build_predicate(clauses)
+
+    def __bool__(self) -> bool:
+        return self.deny or bool(self.clauses)
+
+    def to_sql(self, model: Type[Any]) -> ColumnElement[bool]:
+        """Те же условия в виде SQL выражения для WHERE"""
+        if self.deny:
+            return false()
+        if not self.clauses:
+            return true()
+
+        expressions = []
+        for field, op, arg in self.clauses:
+            column = getattr(model, field, None)
+            if column is None:
+                # Как и в предикате: нет поля - нет доступа
+                return false()
+            expressions.append(_build_sql(column, op, arg, _python_type(column)))
+        return and_(*expressions)
+
+
+def compile_conditions(conditions: Optional[Dict[str, Any]]) -> CompiledConditions:
+    """Проверяет и компилирует условия, ValueError при неверном формате"""
+    if not conditions:
+        return CompiledConditions(())
+
+    if not isinstance(conditions, dict):
+        raise ValueError('Условия должны быть объектом JSON')
+
+    clauses: List[Clause] = []
+    for key, value in conditions.items():
+        if not isinstance(key, str) or not key:
+            raise ValueError(f'Некорректное имя поля в условиях: {key!r}')
+
+        if isinstance(value, dict):
+            if not value:
+                raise ValueError(f'Пустой набор операторов для поля {key}')
+            for op, arg in value.items():
+                clauses.append(_normalize(key, op, arg))
+            continue
+
+        field, op = key, 'in' if isinstance(value, list) else 'eq'
+        for prefix, prefix_op in _PREFIX_OPERATORS:
+            if key.startswith(prefix) and len(key) > len(prefix):
+                field, op = key[len(prefix):], prefix_op
+                break
+
+        clauses.append(_normalize(field, op, value))
+
+    return CompiledConditions(tuple(clauses))
+
+
+def _normalize(field: str, op: str, arg: Any) -> Clause:
+    if op not in OPERATORS:
+        raise ValueError(f'Неизвестный оператор условия {op!r} для поля {field}')
+
+    if op in ('in', 'not_in'):
+        if not isinstance(arg, list) or not all(_is_scalar(item) for item in arg):
+            raise ValueError(f'Оператор {op} для поля {field} ожидает список значений')
+        return field, op, frozenset(arg)
+
+    if op == 'range':
+        if (
+            not isinstance(arg, list) or len(arg) != 2
+            or not all(_is_scalar(item) and item is not None for item in arg)
+        ):
+            raise ValueError(f'Оператор range для поля {field} ожидает список [от, до]')
+        return field, op, tuple(arg)
+
+    if not _is_scalar(arg):
+        raise ValueError(f'Оператор {op} для поля {field} ожидает скалярное значение')
+    if op != 'eq' and arg is None:
+        raise ValueError(f'Оператор {op} для поля {field} не поддерживает null')
+    return field, op, arg
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _build_test(op: str, arg: Any) -> Callable[[Any], bool]:
+    if op == 'eq':
+        return lambda value: value == arg
+    if op == 'in':
+        return arg.__contains__
+    if op == 'not_in':
+        return lambda value: value not in arg
+    if op == 'gt':
+        return lambda value: value is not None and value > arg
+    if op == 'gte':
+        return lambda value: value is not None and value >= arg
+    if op == 'lt':
+        return lambda value: value is not None and value < arg
+    if op == 'lte':
+        return lambda value: value is not None and value <= arg
+
+    low, high = arg
+    return lambda value: value is not None and low <= value <= high
+
+
+def _python_type(column: Any) -> Optional[type]:
+    try:
+        return column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def _comparable(python_type: Optional[type], value: Any) -> bool:
+    """Сравнимо ли значение условия со значением колонки так же, как в Python"""
+    if python_type is None or value is None:
+        return True
+    if issubclass(python_type, (int, float, Decimal)):
+        return isinstance(value, (int, float))
+    return isinstance(value, python_type)
+
+
+def _build_sql(
+    column: Any,
+    op: str,
+    arg: Any,
+    python_type: Optional[type] = None
+) -> ColumnElement[bool]:
+    # NULL обрабатывается явно, чтобы совпадать с предикатом.
+    # Значение другого типа предикат никогда не пропускает (неравенство или
+    # TypeError), поэтому в SQL оно не попадает: иначе SQLite сравнит его
+    # по своим правилам, а Postgres вернет ошибку
+    if op == 'eq':
+        if arg is None:
+            return column.is_(None)
+        return column == arg if _comparable(python_type, arg) else false()
+    if op in ('in', 'not_in'):
+        values = [
+            value for value in arg
+            if value is not None and _comparable(python_type, value)
+        ]
+        if op == 'in':
+            clause = column.in_(values)
+            return or_(clause, column.is_(None)) if None in arg else clause
+        clause = column.not_in(values)
+        return and_(column.is_not(None), clause) if None in arg else or_(column.is_(None), clause)
+    bounds = arg if op == 'range' else (arg,)
+    if not all(_comparable(python_type, value) for value in bounds):
+        return false()
+
+    if op == 'gt':
+        return column > arg
+    if op == 'gte':
+        return column >= arg
+    if op == 'lt':
+        return column < arg
+    if op == 'lte':
+        return column <= arg
+
+    low, high = arg
+    return column.between(low, high)
+
+
+def _build_predicate(clauses: Tuple[Clause, ...]) -> Callable[[Any], bool]:
+    if not clauses:
+        return _allow
+
+    tests = tuple((field, _build_test(op, arg)) for field, op, arg in clauses)
+
+    def predicate(obj: Any) -> bool:
+        try:
+            for field, test in tests:
+                value = getattr(obj, field, _MISSING)
+                if value is _MISSING or not test(value):
+                    return False
+        except TypeError:
+            # Несравнимые типы значения и условия
+            return False
+        return True
+
+    return predicate
+
+
+def _allow(obj: Any) -> bool:
+    return True
+
+
+def _deny(obj: Any) -> bool:
+    return False
+
+
+# Для правил с некорректными условиями в БД
+DENY_ALL = CompiledConditions((), deny=True)
@@ -4,9 +4,97 @@ import os
 class Settings:
     ASYNC_DB_URL: str = os.getenv("DB_URL", '')
 
+    # Реплика для чтения (пусто - чтение с основной БД) и окно, в течение
+    # которого пользователь после своей записи читает с основной БД. Время
+    # записи хранится по id пользователя рядом с шиной POLICY_BUS, для
+    # нескольких воркеров нужна шина file
+    DB_REPLICA_URL: str = os.getenv("DB_REPLICA_URL", '')
+    DB_READ_YOUR_WRITES_WINDOW: float = float(os.getenv("DB_READ_YOUR_WRITES_WINDOW", '5'))
+
+    # Пул соединений (не применяется к SQLite)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", '5'))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", '10'))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", '30'))
+    # Время жизни соединения в секундах (-1 - без ограничения)
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", '-1'))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", 'false').lower() == 'true'
+    # Кэш prepared statements asyncpg (0 - отключен, например за pgbouncer)
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", '100'))
+
     JWT_SECRET: str = os.getenv("JWT_SECRET", '')
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", '')
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
+    # Ключи для RS256/ES256/EdDSA: каталог, kid для подписи (пусто - самый новый)
+    # и интервал проверки каталога на новые ключи
+    JWT_KEYS_DIR: str = os.getenv("JWT_KEYS_DIR", '')
+    JWT_ACTIVE_KID: str = os.getenv("JWT_ACTIVE_KID", '')
+    JWT_KEYS_RELOAD_INTERVAL: float = float(os.getenv("JWT_KEYS_RELOAD_INTERVAL", '30'))
+    JWT_JWKS_MAX_AGE: int = int(os.getenv("JWT_JWKS_MAX_AGE", '300'))
+    # Максимум токенов в одном запросе /api/auth/introspect
+    INTROSPECT_MAX_TOKENS: int = int(os.getenv("INTROSPECT_MAX_TOKENS", '100'))
+    # Ключи API шлюзов для introspect в заголовке X-Gateway-Key, через запятую
+    # (пусто - эндпоинт закрыт), и допуск: token bucket по IP и предел
+    # одновременных запросов (0 - отключены)
+    INTROSPECT_GATEWAY_KEYS: list = [
+        k.strip() for k in os.getenv("INTROSPECT_GATEWAY_KEYS", '').split(',') if k.strip()
+    ]
+    INTROSPECT_RATE_PER_MINUTE: float = float(os.getenv("INTROSPECT_RATE_PER_MINUTE", '600'))
+    INTROSPECT_BURST: int = int(os.getenv("INTROSPECT_BURST", '100'))
+    INTROSPECT_MAX_IN_FLIGHT: int = int(os.getenv("INTROSPECT_MAX_IN_FLIGHT", '16'))
+    # Кэш проверенных токенов (0 - отключен)
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", '10000'))
+    # Пользователь запроса из claims токена (false - всегда из БД)
+    AUTH_STATELESS_PRINCIPAL: bool = os.getenv("AUTH_STATELESS_PRINCIPAL", 'true').lower() == 'true'
+    # Кэш пользователей для проверки токенов по БД (0 - отключен)
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", '10000'))
+    PRINCIPAL_CACHE_TTL: float = float(os.getenv("PRINCIPAL_CACHE_TTL", '30'))
+
+    # Схемы хэширования паролей: первая основная, остальные перехэшируются при входе.
+    # Библиотека каждой схемы должна быть установлена (argon2 - argon2-cffi)
+    PASSWORD_SCHEMES: list = [s.strip() for s in os.getenv("PASSWORD_SCHEMES", 'bcrypt').split(',')]
+    # Стоимость основной схемы (пусто - по умолчанию библиотеки)
+    PASSWORD_ROUNDS: int | None = int(os.getenv("PASSWORD_ROUNDS")) if os.getenv("PASSWORD_ROUNDS") else None
+    # Целевое время хэширования для подбора стоимости при запуске (0 - без подбора)
+    PASSWORD_HASH_TARGET_MS: float = float(os.getenv("PASSWORD_HASH_TARGET_MS", '0'))
+
+    # Отозванные токены: размер Bloom фильтра, доля ложных срабатываний
+    # и интервал синхронизации с БД
+    REVOCATION_BLOOM_CAPACITY: int = int(os.getenv("REVOCATION_BLOOM_CAPACITY", '100000'))
+    REVOCATION_BLOOM_ERROR_RATE: float = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", '0.001'))
+    REVOCATION_SYNC_INTERVAL: float = float(os.getenv("REVOCATION_SYNC_INTERVAL", '5'))
+
+    # Пул хэширования паролей: число потоков и длина очереди
+    HASH_WORKERS: int = int(os.getenv("HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    HASH_QUEUE_SIZE: int = int(os.getenv("HASH_QUEUE_SIZE", '64'))
+
+    # Допуск к login/register: token bucket по IP и email (0 - отключен)
+    # и предел одновременных запросов
+    AUTH_IP_RATE_PER_MINUTE: float = float(os.getenv("AUTH_IP_RATE_PER_MINUTE", '60'))
+    AUTH_IP_BURST: int = int(os.getenv("AUTH_IP_BURST", '20'))
+    AUTH_EMAIL_RATE_PER_MINUTE: float = float(os.getenv("AUTH_EMAIL_RATE_PER_MINUTE", '10'))
+    AUTH_EMAIL_BURST: int = int(os.getenv("AUTH_EMAIL_BURST", '5'))
+    AUTH_ADMISSION_KEYS: int = int(os.getenv("AUTH_ADMISSION_KEYS", '100000'))
+    AUTH_MAX_IN_FLIGHT: int = int(os.getenv("AUTH_MAX_IN_FLIGHT", '32'))
+
+    # Шина инвалидации политики доступа и отметки сброса кэшей по ключу: memory или file
+    POLICY_BUS: str = os.getenv("POLICY_BUS", 'memory')
+    POLICY_BUS_PATH: str = os.getenv("POLICY_BUS_PATH", '/tmp/auth_policy_version')
+    POLICY_BUS_POLL_INTERVAL: float = float(os.getenv("POLICY_BUS_POLL_INTERVAL", '1.0'))
+    # Сверка поколения со строкой policy_version в БД (0 - отключена): шина
+    # memory не видит изменений правил в других воркерах
+    POLICY_VERSION_POLL_INTERVAL: float = float(os.getenv("POLICY_VERSION_POLL_INTERVAL", '1.0'))
+
+    # Общий снимок политики для воркеров: загрузка без запросов правил к БД (пусто - отключен)
+    POLICY_SNAPSHOT_PATH: str = os.getenv("POLICY_SNAPSHOT_PATH", '')
+    POLICY_SNAPSHOT_WAIT: float = float(os.getenv("POLICY_SNAPSHOT_WAIT", '5.0'))
+
+    # Лог решений авторизации: доля записываемых решений и запись всех отказов
+    DECISION_LOG_SAMPLE_RATE: float = float(os.getenv("DECISION_LOG_SAMPLE_RATE", '1.0'))
+    DECISION_LOG_DENY_FULL_RATE: bool = os.getenv("DECISION_LOG_DENY_FULL_RATE", 'true').lower() == 'true'
+
+    # Кэш решений авторизации (0 - отключен)
+    DECISION_CACHE_SIZE: int = int(os.getenv("DECISION_CACHE_SIZE", '10000'))
+    DECISION_CACHE_TTL: float = float(os.getenv("DECISION_CACHE_TTL", '60'))
 
 
 settings = Settings()
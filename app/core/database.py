@@ -1,22 +1,260 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+import time
+
+from sqlalchemy import Delete, Insert, Update, event, exc
+from sqlalchemy.engine import URL, Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
 
 
 Base = declarative_base()
 
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул соединений с учетом времени ожидания соединения и таймаутов"""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        wait = time.perf_counter() - started
+        self.acquired += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return connection
+
+
+def engine_options(url: str | URL) -> Dict[str, Any]:
+    """Параметры пула и драйвера из настроек"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        # Для SQLite остаются настройки SQLAlchemy по умолчанию
+        return {}
+
+    options: Dict[str, Any] = {
+        'poolclass': InstrumentedPool,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+    }
+    if url.get_driver_name() == 'asyncpg':
+        # 0 отключает prepared statements (нужно за pgbouncer в режиме transaction)
+        options['connect_args'] = {'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE}
+    return options
+
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, Any]:
+    pool = engine.sync_engine.pool
+    stats: Dict[str, Any] = {'class': type(pool).__name__}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedPool):
+        stats.update({
+            'acquired': pool.acquired,
+            'timeouts': pool.timeouts,
+            'wait_avg_ms': pool.wait_total / pool.acquired * 1000 if pool.acquired else 0.0,
+            'wait_max_ms': pool.wait_max * 1000,
+        })
+    return stats
+
+
+class WriteMarker:
+    """Время последней записи пользователя в пределах запроса
+
+    Начальное значение берется из общего для воркеров хранилища по id
+    пользователя, поэтому read-your-writes соблюдается на любом воркере,
+    а не только на том, который выполнил запись.
+    """
+
+    __slots__ = ('last_write', 'wrote')
+
+    def __init__(self, last_write: float = 0.0):
+        self.last_write = last_write
+        self.wrote = False
+
+    def record(self) -> None:
+        self.last_write = time.time()
+        self.wrote = True
+
+    def is_recent(self) -> bool:
+        return time.time() - self.last_write < settings.DB_READ_YOUR_WRITES_WINDOW
+
+
+# Метка записей текущего запроса, выставляется middleware
+write_marker: ContextVar[Optional[WriteMarker]] = ContextVar('write_marker', default=None)
+
+# Опция запроса: читать с основной БД независимо от реплики
+READ_PRIMARY = {'read_primary': True}
+
+
+class PrimarySession(Session):
+    """Сессия, запоминающая автора записи после commit"""
+
+
+@event.listens_for(PrimarySession, 'after_flush')
+def _mark_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+@event.listens_for(PrimarySession, 'do_orm_execute')
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['wrote'] = True
+
+
+@event.listens_for(PrimarySession, 'after_commit')
+def _remember_writer(session):
+    marker = write_marker.get()
+    if session.info.pop('wrote', False) and marker is not None:
+        marker.record()
+
+
+@event.listens_for(PrimarySession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('wrote', None)
+
+
+class RoutingSession(PrimarySession):
+    """Чтение с реплики, запись и чтение после своих записей - с основной БД"""
+
+    def __init__(self, *args: Any, primary: Engine, replica: Optional[Engine] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is None or self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            return self.primary
+        if clause is not None and clause.get_execution_options().get('read_primary'):
+            return self.primary
+        marker = write_marker.get()
+        if marker is not None and marker.is_recent():
+            return self.primary
+        return self.replica
+
+
 # Создание асинхронного движка
-engine = create_async_engine(settings.ASYNC_DB_URL)
+engine = create_async_engine(settings.ASYNC_DB_URL, **engine_options(settings.ASYNC_DB_URL))
+
+# Реплика для чтения (если не задана - чтение с основной БД)
+replica_engine = (
+    create_async_engine(settings.DB_REPLICA_URL, **engine_options(settings.DB_REPLICA_URL))
+    if settings.DB_REPLICA_URL else None
+)
 
 # Настройка асинхронной сессии
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+AsyncSessionLocal = sessionmaker(
+    engine, class_=AsyncSession, sync_session_class=PrimarySession, expire_on_commit=False
+)
+
+ReadSessionLocal = sessionmaker(
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    primary=engine.sync_engine,
+    replica=replica_engine.sync_engine if replica_engine else None,
+    expire_on_commit=False,
+)
+
+
+class LazySession:
+    """Сессия, создаваемая при первом обращении
+
+    Соединение берется из пула только при первом запросе. С release_after_read
+    транзакция без изменений завершается сразу после каждого чтения, и
+    соединение возвращается в пул до конца обработки запроса.
+    """
+
+    def __init__(self, factory: Callable[[], AsyncSession], release_after_read: bool = False):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        self._writing = False
+        self.release_after_read = release_after_read
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._factory()
+            # После commit объекты должны оставаться загруженными
+            if self._session.sync_session.expire_on_commit:
+                self.release_after_read = False
+        return self._session
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.session, name)
+
+    async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> Any:
+        if isinstance(statement, (Insert, Update, Delete)):
+            self._writing = True
+        return await self._read(self.session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._read(self.session.scalar, *args, **kwargs)
+
+    async def scalars(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._read(self.session.scalars, *args, **kwargs)
+
+    async def get(self, *args: Any, **kwargs: Any) -> Any:
+        return await self._read(self.session.get, *args, **kwargs)
+
+    async def commit(self) -> None:
+        await self.session.commit()
+        self._writing = False
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+        self._writing = False
+
+    async def _read(self, method: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        session = self.session
+        # Изменения будут записаны autoflush, транзакцию завершает только commit
+        if session.new or session.dirty or session.deleted:
+            self._writing = True
+
+        result = await method(*args, **kwargs)
+
+        if self.release_after_read and not self._writing and session.in_transaction():
+            await session.commit()
+        return result
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
 
 
 async def get_db():
     """Dependency для получения асинхронной сессии БД"""
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+    session = LazySession(AsyncSessionLocal)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_read_db():
+    """Dependency для сессии только для чтения, запросы идут на реплику"""
+    session = LazySession(ReadSessionLocal, release_after_read=True)
+    try:
+        yield session
+    finally:
+        await session.close()
@@ -0,0 +1,89 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+import atexit
+import logging
+import queue
+import random
+import sys
+
+from app.core.config import settings
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Передает запись в очередь без форматирования в вызывающем потоке"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы решений - неизменяемые значения, форматирование
+        # безопасно выполнить позже в фоновом потоке
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_queue_logger(logger: logging.Logger) -> None:
+    """Запись логов в stdout из фонового потока"""
+    global _listener
+
+    if logger.handlers:
+        return
+
+    logger.setLevel(logging.INFO)
+
+    handler = logging.StreamHandler(sys.stdout)
+    formatter = logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S'
+    )
+    handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(DeferredQueueHandler(log_queue))
+
+    if _listener is None:
+        _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class DecisionLog:
+    """Структурированный лог решений авторизации с сэмплированием"""
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        sample_rate: float = 1.0,
+        deny_full_rate: bool = True
+    ):
+        self.logger = logger
+        self.sample_rate = sample_rate
+        self.deny_full_rate = deny_full_rate
+
+    def log(
+        self,
+        user: Any,
+        resource: str,
+        action: str,
+        allowed: bool,
+        reason: str
+    ) -> None:
+        # Отказы при deny_full_rate пишутся всегда
+        if (allowed or not self.deny_full_rate) and self.sample_rate < 1.0:
+            if random.random() >= self.sample_rate:
+                return
+
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        self.logger.info(
+            'decision=%s user_id=%s role_id=%s resource=%s action=%s reason=%s',
+            'allow' if allowed else 'deny', user.id, user.role_id, resource, action, reason,
+        )
+
+
+def create_decision_log(logger: logging.Logger) -> DecisionLog:
+    return DecisionLog(
+        logger,
+        sample_rate=settings.DECISION_LOG_SAMPLE_RATE,
+        deny_full_rate=settings.DECISION_LOG_DENY_FULL_RATE,
+    )
@@ -36,3 +36,23 @@ class NotFoundException(HTTPException):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=detail
         )
+
+
+class TooManyRequestsException(HTTPException):
+    """429 - Слишком много запросов"""
+    def __init__(self, detail: str = 'Слишком много запросов', retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={'Retry-After': str(retry_after)}
+        )
+
+
+class ServiceUnavailableException(HTTPException):
+    """503 - Сервис перегружен"""
+    def __init__(self, detail: str = 'Сервис временно недоступен', retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={'Retry-After': str(retry_after)}
+        )
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+import asyncio
+import threading
+import time
+
+from app.core import security
+from app.core.config import settings
+
+
+class HashingOverloaded(Exception):
+    """Очередь хэширования паролей заполнена"""
+
+
+class PasswordHasher:
+    """Хэширование паролей в отдельном пуле потоков
+
+    bcrypt освобождает GIL, поэтому потоки используют свободные ядра и не
+    блокируют event loop. Очередь ограничена: при переполнении сразу
+    выбрасывается HashingOverloaded.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='hasher')
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._count = 0
+        self._rejected = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(security.verify_password, password, hashed_password)
+
+    async def verify_and_update(
+        self,
+        password: str,
+        hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self._submit(security.verify_and_update_password, password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(security.get_password_hash, password)
+
+    async def _submit(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise HashingOverloaded('Очередь хэширования паролей заполнена')
+
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, duration = await loop.run_in_executor(self._executor, self._timed, func, args)
+        finally:
+            self._in_flight -= 1
+
+        self._count += 1
+        self._total_time += duration
+        self._max_time = max(self._max_time, duration)
+        return result
+
+    def _timed(self, func: Callable[..., Any], args: Tuple[Any, ...]) -> Tuple[Any, float]:
+        with self._lock:
+            self._running += 1
+        started = time.perf_counter()
+        try:
+            return func(*args), time.perf_counter() - started
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Число задач, ожидающих свободного потока"""
+        return max(0, self._in_flight - self._running)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'queue_depth': self.queue_depth,
+            'hashes': self._count,
+            'rejected': self._rejected,
+            'avg_ms': self._total_time / self._count * 1000 if self._count else 0.0,
+            'max_ms': self._max_time * 1000,
+        }
+
+
+password_hasher = PasswordHasher(settings.HASH_WORKERS, settings.HASH_QUEUE_SIZE)
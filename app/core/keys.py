@@ -0,0 +1,167 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import logging
+import os
+import time
+
+import jwt
+
+from app.core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ('RS256', 'RS384', 'RS512', 'ES256', 'ES384', 'ES512', 'EdDSA')
+
+PRIVATE_SUFFIX = '.pem'
+PUBLIC_SUFFIX = '.pub.pem'
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    algorithm: str
+    # Объекты ключей разобраны заранее, jwt.decode использует их без повторного чтения PEM
+    private_key: Optional[Any]
+    public_key: Any
+
+
+class KeyRing:
+    """Ключи подписи токенов, индексированные по kid
+
+    Для HS* используется общий секрет без kid. Для асимметричных
+    алгоритмов ключи читаются из каталога: <kid>.pem - закрытый ключ,
+    <kid>.pub.pem - открытый ключ выведенного из оборота ключа. Новые
+    файлы в каталоге подхватываются не чаще reload_interval.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        secret: str = '',
+        keys_dir: str = '',
+        active_kid: str = '',
+        reload_interval: float = 30.0
+    ):
+        self.algorithm = algorithm
+        self.secret = secret
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.reload_interval = reload_interval
+        self.generation = 0
+        self._keys: Dict[str, SigningKey] = {}
+        self._active: Optional[SigningKey] = None
+        self._dir_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._listeners: List[Callable[[], None]] = []
+
+        if self.asymmetric:
+            self.reload()
+
+    @property
+    def asymmetric(self) -> bool:
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    def on_rotate(self, listener: Callable[[], None]) -> None:
+        """Подписка на смену набора ключей"""
+        self._listeners.append(listener)
+
+    def reload(self) -> None:
+        """Чтение ключей из каталога"""
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        keys: Dict[str, SigningKey] = {}
+        newest: Optional[tuple] = None
+
+        for name in sorted(os.listdir(self.keys_dir)):
+            path = os.path.join(self.keys_dir, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+
+            if name.endswith(PUBLIC_SUFFIX):
+                kid = name[:-len(PUBLIC_SUFFIX)]
+                if kid not in keys:
+                    keys[kid] = SigningKey(kid, self.algorithm, None, algorithm.prepare_key(data))
+            elif name.endswith(PRIVATE_SUFFIX):
+                kid = name[:-len(PRIVATE_SUFFIX)]
+                private_key = algorithm.prepare_key(data)
+                keys[kid] = SigningKey(kid, self.algorithm, private_key, private_key.public_key())
+                mtime = os.stat(path).st_mtime_ns
+                if newest is None or mtime > newest[0]:
+                    newest = (mtime, kid)
+
+        # Без явного kid подписываем самым новым закрытым ключом
+        active_kid = self.active_kid or (newest[1] if newest else '')
+        active = keys.get(active_kid)
+        if active is None or active.private_key is None:
+            raise RuntimeError(f'Нет закрытого ключа для подписи токенов: {active_kid or self.keys_dir}')
+
+        changed = keys.keys() != self._keys.keys() or active.kid != getattr(self._active, 'kid', None)
+        self._keys = keys
+        self._active = active
+        self._dir_mtime = os.stat(self.keys_dir).st_mtime_ns
+        self._checked_at = time.monotonic()
+
+        if changed:
+            self.generation += 1
+            logger.info('Ключи подписи: %s, активный kid=%s', sorted(keys), active.kid)
+            for listener in self._listeners:
+                listener()
+
+    def _maybe_reload(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        if os.stat(self.keys_dir).st_mtime_ns != self._dir_mtime:
+            self.reload()
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        if not self.asymmetric:
+            return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+        self._maybe_reload()
+        return jwt.encode(
+            payload, self._active.private_key, algorithm=self.algorithm,
+            headers={'kid': self._active.kid}
+        )
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Проверка подписи и срока действия, ошибки - исключения jwt"""
+        if not self.asymmetric:
+            return jwt.decode(token, self.secret, algorithms=[self.algorithm])
+
+        kid = jwt.get_unverified_header(token).get('kid')
+        key = self._keys.get(kid)
+        if key is None:
+            # Токен мог быть подписан ключом, добавленным после загрузки
+            self._maybe_reload(force=True)
+            key = self._keys.get(kid)
+            if key is None:
+                raise jwt.InvalidTokenError('Неизвестный kid')
+
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+    def jwks(self) -> Dict[str, Any]:
+        """Открытые ключи в формате JWKS"""
+        if not self.asymmetric:
+            return {'keys': []}
+
+        self._maybe_reload()
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        keys = []
+        for key in self._keys.values():
+            jwk = algorithm.to_jwk(key.public_key, as_dict=True)
+            jwk.update({'kid': key.kid, 'alg': key.algorithm, 'use': 'sig'})
+            keys.append(jwk)
+        return {'keys': keys}
+
+
+def create_key_ring() -> KeyRing:
+    return KeyRing(
+        settings.JWT_ALGORITHM,
+        secret=settings.JWT_SECRET,
+        keys_dir=settings.JWT_KEYS_DIR,
+        active_kid=settings.JWT_ACTIVE_KID,
+        reload_interval=settings.JWT_KEYS_RELOAD_INTERVAL,
+    )
+
+
+key_ring = create_key_ring()
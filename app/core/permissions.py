@@ -1,45 +1,38 @@
-from typing import List, Dict, Any, Optional, Type
+from typing import Any, List, Optional, Sequence, Tuple, Type
 import logging
-import sys
-from enum import Enum
 
-from sqlalchemy import select
-from sqlalchemy.sql import Select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import and_, false, or_, select
+from sqlalchemy.sql import ColumnElement, Delete, Select, Update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models import User, Permission, Resource, Role, RolePermissionResource
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.decision_log import create_decision_log, setup_queue_logger
+from app.core.policy import (
+    ACCESS_ALL, ACCESS_OWN, FILTER_ALL, FILTER_DENY, FILTER_OWN,
+    CompiledRule, Policy, Scope, policy_engine
+)
+from app.core.principal import Principal
+from app.models import User
 
 
 logger = logging.getLogger(__name__)
 
+setup_queue_logger(logger)
 
-def setup_logger():
-    if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        handler = logging.StreamHandler(sys.stdout)
+decision_log = create_decision_log(logger)
 
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            datefmt='%H:%M:%S'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+# Кэш решений между запросами, ключ включает поколение политики
+decision_cache = TTLCache(settings.DECISION_CACHE_SIZE, settings.DECISION_CACHE_TTL)
 
-
-setup_logger()
-
-
-class Scope(str, Enum):
-    ALL = 'all'
-    OWN = 'own'
+_MISSING = object()
 
 
 class PermissionChecker:
     def __init__(
         self,
         db: AsyncSession,
-        user: User,
+        user: User | Principal,
         resource: str,
         action: str,
         resource_obj: Optional[Any] = None
@@ -55,147 +48,213 @@ class PermissionChecker:
             self._permissions = await self.get_user_permissions()
         return self._permissions
 
+    async def get_policy(self) -> Policy:
+        if not hasattr(self, '_policy'):
+            self._policy = await policy_engine.get(self.db)
+        return self._policy
+
+    async def get_access_bits(self) -> int:
+        """Биты доступа роли пользователя из маски политики"""
+        if not hasattr(self, '_access_bits'):
+            policy = await self.get_policy()
+            self._access_bits = policy.access_bits(self.user.role_id, self.resource, self.action)
+        return self._access_bits
+
     async def check_permission(self) -> bool:
         """Проверка прав с учетом scope"""
-        permissions = await self.get_permissions()
-        logger.info(
-            f"Проверка прав: user_id={self.user.id}, email={self.user.email}, "
-            f"resource={self.resource}, action={self.action}"
-        )
+        key = await self._decision_key()
+        if key is not None:
+            cached = decision_cache.get(key)
+            if cached is not None:
+                return self._decision(*cached)
+
+        allowed, reason = await self._evaluate()
+
+        if key is not None:
+            decision_cache.set(key, (allowed, reason))
+        return self._decision(allowed, reason)
+
+    async def _evaluate(self) -> Tuple[bool, str]:
+        access = await self.get_access_bits()
 
-        if not permissions:
-            logger.info('Нет прав')
-            return False
+        if not access:
+            return False, 'no_rules'
 
-        # 1. Если пользователь имеет разрешение без привязки к ресурсу
-        for p in permissions:
-            if p.resource_id is None:
-                logger.info('Есть разрешение без привязки к ресурсу')
-                return True
+        # 1. Правило scope=all без условий открывает любой объект,
+        # фильтр списка в этом случае тоже не строится
+        if await self.is_unrestricted():
+            return True, 'unrestricted_rule'
 
         # 2. Если нет конкретного объекта - отдаем для фильтрации
         if self.resource_obj is None:
-            logger.info('Нет конкретного ресурса, доступ есть')
-            return True
+            return True, 'no_object'
 
-        # 3. Проверяем доступ к конкретному объекту
+        # 3. Проверяем доступ к конкретному объекту теми же правилами,
+        # включая правила без привязки к ресурсу, что и фильтр списка
+        permissions = await self.get_permissions()
         for perm in permissions:
-            if await self._check_object_permission(perm):
-                logger.info('_check_object_permission = доступ есть')
-                return True
+            if self._check_object_permission(perm, self.resource_obj):
+                return True, 'object_rule'
 
-        return False
+        return False, 'object_denied'
 
-    async def get_user_permissions(self) -> List[RolePermissionResource]:
-        """Получаем все разрешения пользователя"""
-
-        # Поиск разрешения с привязкой к ресурсу
-        stmt = (
-            select(RolePermissionResource)
-            .options(
-                selectinload(RolePermissionResource.permission),  # Для scope
-            )
-            .join(RolePermissionResource.role)
-            .join(RolePermissionResource.permission)
-            .join(RolePermissionResource.resource)
-            .where(Role.id == self.user.role_id)
-            .where(Permission.code == self.action)
-            .where(Resource.code == self.resource)
-        )
-
-        result = await self.db.execute(stmt)
-        permissions = result.scalars().all()
-
-        # Поиск разрешения без привязки к ресурсу
-        if not permissions:
-            stmt = (
-                select(RolePermissionResource)
-                .options(
-                    selectinload(RolePermissionResource.permission),  # Для scope
-                )
-                .join(RolePermissionResource.role)
-                .join(RolePermissionResource.permission)
-                .where(Role.id == self.user.role_id)
-                .where(Permission.code == self.action)
-                .where(RolePermissionResource.resource_id.is_(None))
-            )
-            result = await self.db.execute(stmt)
-            permissions = result.scalars().all()
-
-        return permissions
-
-    async def _check_object_permission(self, rule: RolePermissionResource) -> bool:
-        """Проверка доступа к конкретному объекту на основе scope"""
-        # Доступ ко всем
-        if rule.permission.scope == Scope.ALL:
-            return await self._check_conditions(rule.conditions)
+    async def _decision_key(self) -> Optional[tuple]:
+        """Ключ кэша решений, None - решение не кэшируется"""
+        policy = await self.get_policy()
+        key = (policy.generation, self.user.role_id, self.resource, self.action)
 
-        # Доступ к своим
-        if rule.permission.scope == Scope.OWN:
-            if self.user.id != self.resource_obj.owner_id:
-                return False
+        # Решение не зависит от объекта
+        access = await self.get_access_bits()
+        if self.resource_obj is None or not access or await self.is_unrestricted():
+            return key
+
+        # Решение зависит только от владельца и полей из условий правил
+        permissions = await self.get_permissions()
+        obj = self.resource_obj
+        is_owner = None
+        if any(perm.scope == Scope.OWN for perm in permissions):
+            is_owner = getattr(obj, 'owner_id', None) == self.user.id
 
-            return await self._check_conditions(rule.conditions)
+        fields = tuple(dict.fromkeys(f for perm in permissions for f in perm.predicate.fields))
+        values = tuple(getattr(obj, f, _MISSING) for f in fields)
 
-        return False
+        key = key + ('object', is_owner, fields, values)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
 
-    async def _check_conditions(self, conditions: Optional[Dict]) -> bool:
-        """Проверка дополнительных условий"""
-        if not conditions:
-            return True
+    def _decision(self, allowed: bool, reason: str) -> bool:
+        decision_log.log(self.user, self.resource, self.action, allowed, reason)
+        return allowed
 
-        for key, value in conditions.items():
-            if not hasattr(self.resource_obj, key):
+    async def check_many(self, resource_objs: Sequence[Any]) -> List[bool]:
+        """Проверка прав для списка объектов: правила получаются один раз"""
+        access = await self.get_access_bits()
+
+        if not access:
+            return [False] * len(resource_objs)
+
+        if await self.is_unrestricted():
+            return [True] * len(resource_objs)
+
+        permissions = await self.get_permissions()
+        return [
+            any(self._check_object_permission(perm, obj) for perm in permissions)
+            for obj in resource_objs
+        ]
+
+    async def filter_many(self, resource_objs: Sequence[Any]) -> List[Any]:
+        """Оставляет только объекты, к которым есть доступ"""
+        mask = await self.check_many(resource_objs)
+        return [obj for obj, allowed in zip(resource_objs, mask) if allowed]
+
+    async def get_user_permissions(self) -> Tuple[CompiledRule, ...]:
+        """Получаем все разрешения пользователя из политики в памяти"""
+        policy = await self.get_policy()
+        return policy.get_rules(self.user.role_id, self.resource, self.action)
+
+    def _check_object_permission(self, rule: CompiledRule, resource_obj: Any) -> bool:
+        """Проверка доступа к конкретному объекту на основе scope"""
+        # Доступ ко всем
+        if rule.scope == Scope.ALL:
+            return rule.predicate.check(resource_obj)
+
+        # Доступ к своим, у объекта без владельца своих нет (как и в SQL)
+        if rule.scope == Scope.OWN:
+            if self.user.id != getattr(resource_obj, 'owner_id', None):
                 return False
 
-            obj_value = getattr(self.resource_obj, key)
+            return rule.predicate.check(resource_obj)
+
+        return False
 
-            if isinstance(value, list):
-                if obj_value not in value:
-                    return False
-            else:
-                if obj_value != value:
-                    return False
+    async def get_scope_filter(self) -> str:
+        """Заранее вычисленный фильтр списка для роли, ресурса и действия"""
+        policy = await self.get_policy()
+        return policy.scope_filter(self.user.role_id, self.resource, self.action)
 
-        return True
+    async def is_unrestricted(self) -> bool:
+        """Есть правило scope=all без условий: доступ к любому объекту без фильтра"""
+        return await self.get_scope_filter() == FILTER_ALL
 
     async def get_user_max_scope(self) -> str:
-        """Определяет максимальный scope пользователя"""
-        permissions = await self.get_permissions()
-        scopes = [p.permission.scope for p in permissions]
+        """Определяет максимальный scope пользователя по битам доступа"""
+        access = await self.get_access_bits()
 
         # Приоритет: all > own
-        if Scope.ALL in scopes:
-            logger.info('Область доступа пользователя: all')
+        if access & ACCESS_ALL:
             return Scope.ALL
-        if Scope.OWN in scopes:
-            logger.info('Область доступа пользователя: own')
+        if access & ACCESS_OWN:
             return Scope.OWN
 
         return "none"  # Нет доступа
 
-    # В текущей реализации оставлю так
-    # Но в идеале сделать запрос на основании scope через сервис -> репозиторий
     async def apply_scope_filter(
         self,
         resource_model: Type[Any],
-        base_stmt: Select | None = None
-    ) -> Select:
-        """Применяет фильтры к запросу в зависимости от scope пользователя"""
-        scope = await self.get_user_max_scope()
-
+        base_stmt: Select | Update | Delete | None = None
+    ) -> Select | Update | Delete:
+        """Применяет фильтры к запросу в зависимости от scope и условий правил"""
         if base_stmt is None:
             base_stmt = select(resource_model)
 
-        if scope == Scope.ALL:
-            logger.info('Фильтрация запроса в зависимости от scope: Без фильтров')
+        clause = await self.get_scope_clause(resource_model)
+        if clause is None:
             return base_stmt  # Без фильтров
+        return base_stmt.where(clause)
+
+    async def get_scope_clause(self, resource_model: Type[Any]) -> Optional[ColumnElement[bool]]:
+        """SQL условие scope и правил, None - выборка не ограничивается"""
+        scope_filter = await self.get_scope_filter()
+
+        if scope_filter == FILTER_ALL:
+            logger.debug('Фильтрация запроса: без фильтров')
+            return None
 
-        if scope == Scope.OWN:
+        if scope_filter == FILTER_DENY:
+            logger.debug('Фильтрация запроса: "пустой" запрос')
+            return false()
+
+        if scope_filter == FILTER_OWN:
             # Фильтруем только свои объекты
             if hasattr(resource_model, 'owner_id'):
-                logger.info('Фильтрация запроса в зависимости от scope: фильтр owner_id=user_id')
-                return base_stmt.where(resource_model.owner_id == self.user.id)
+                logger.debug('Фильтрация запроса: фильтр owner_id=user_id')
+                return resource_model.owner_id == self.user.id
+            return false()
+
+        # Объект доступен, если подходит хотя бы одно правило
+        permissions = await self.get_permissions()
+        clauses = []
+        for rule in permissions:
+            clause = self._rule_clause(rule, resource_model)
+            if clause is None:
+                logger.debug('Фильтрация запроса: без фильтров')
+                return None
+            clauses.append(clause)
+
+        if not clauses:
+            logger.debug('Фильтрация запроса: "пустой" запрос')
+            return false()
+
+        logger.debug('Фильтрация запроса: %s правил', len(clauses))
+        return or_(*clauses)
+
+    def record_decision(self, allowed: bool) -> bool:
+        """Запись решения, принятого базой по условию scope в WHERE изменения"""
+        return self._decision(allowed, 'scope_clause' if allowed else 'object_denied')
+
+    def _rule_clause(self, rule: CompiledRule, resource_model: Type[Any]) -> Optional[ColumnElement[bool]]:
+        """SQL условие одного правила, None - правило не ограничивает выборку"""
+        if rule.scope == Scope.ALL:
+            return rule.predicate.to_sql(resource_model) if rule.predicate else None
+
+        if rule.scope == Scope.OWN and hasattr(resource_model, 'owner_id'):
+            # Фильтруем только свои объекты
+            clause = resource_model.owner_id == self.user.id
+            if rule.predicate:
+                clause = and_(clause, rule.predicate.to_sql(resource_model))
+            return clause
 
-        logger.info('Фильтрация запроса в зависимости от scope: Возвращаем "пустой" запрос')
-        return base_stmt.where(False)  # Возвращаем "пустой" запрос
+        return false()
@@ -0,0 +1,492 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import READ_PRIMARY
+from app.core.conditions import DENY_ALL, CompiledConditions, compile_conditions
+from app.core.policy_bus import Generation, InvalidationBus, create_bus
+from app.core.policy_snapshot import PolicySnapshot, RuleRow, SnapshotView
+from app.models import Permission, PolicyVersion, Resource, RolePermissionResource
+
+
+logger = logging.getLogger(__name__)
+
+
+# Ключ индекса: (role_id, код ресурса или None, код действия)
+RuleKey = Tuple[int, Optional[str], str]
+
+# Биты доступа для (роль, ресурс, действие)
+ACCESS_ANY = 1  # есть хотя бы одно правило
+ACCESS_ALL = 2  # есть правило со scope=all
+ACCESS_OWN = 4  # есть правило со scope=own
+
+_SLOT_BITS = 3
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+
+
+class Scope(str, Enum):
+    ALL = 'all'
+    OWN = 'own'
+
+
+# Фильтр списка для (роль, ресурс, действие)
+FILTER_ALL = 'all'  # есть правило scope=all без условий, фильтр не нужен
+FILTER_OWN = 'own'  # только правила scope=own без условий, фильтр по владельцу
+FILTER_RULES = 'rules'  # фильтр собирается из условий правил
+FILTER_DENY = 'deny'  # правил нет
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    """Правило доступа, развернутое в плоскую структуру без ORM"""
+    id: int
+    role_id: int
+    permission_id: int
+    resource_id: Optional[int]
+    resource: Optional[str]
+    action: str
+    scope: str
+    conditions: Optional[Dict[str, Any]]
+    predicate: CompiledConditions
+
+
+class CompiledPolicy:
+    """Индекс правил доступа в памяти"""
+
+    def __init__(
+        self,
+        rules: List[CompiledRule],
+        version: int = 0,
+        resources: Iterable[str] = (),
+        epoch: str = ''
+    ):
+        self.version = version
+        self.epoch = epoch
+        self.rules = tuple(rules)
+        self.resources = tuple(dict.fromkeys(resources))
+
+        index: Dict[RuleKey, List[CompiledRule]] = {}
+        for rule in rules:
+            index.setdefault((rule.role_id, rule.resource, rule.action), []).append(rule)
+
+        self._index: Dict[RuleKey, Tuple[CompiledRule, ...]] = {
+            key: tuple(value) for key, value in index.items()
+        }
+        self.rules_count = len(rules)
+
+        # Битовая маска роли: по 3 бита на пару (ресурс, действие),
+        # ресурс с индексом 0 - правила без привязки к ресурсу
+        self._resource_index: Dict[str, int] = {}
+        self._action_index: Dict[str, int] = {}
+        for rule in rules:
+            if rule.resource is not None:
+                self._resource_index.setdefault(rule.resource, len(self._resource_index) + 1)
+            self._action_index.setdefault(rule.action, len(self._action_index))
+        self._actions_count = len(self._action_index)
+
+        self._role_masks: Dict[int, int] = {}
+        for rule in rules:
+            bits = _rule_bits(rule.scope)
+            resource = self._resource_index[rule.resource] if rule.resource is not None else 0
+            slot = resource * self._actions_count + self._action_index[rule.action]
+            self._role_masks[rule.role_id] = self._role_masks.get(rule.role_id, 0) | (bits << slot * _SLOT_BITS)
+
+        # Таблица фильтров списка с уже разрешенным переходом к правилам
+        # без привязки к ресурсу для всех известных ресурсов
+        self._filter_table: Dict[RuleKey, str] = {
+            key: _scope_filter([(rule.scope, bool(rule.predicate)) for rule in value])
+            for key, value in self._index.items()
+        }
+        known_resources = set(self.resources) | set(self._resource_index)
+        for (role_id, resource, action), scope_filter in list(self._filter_table.items()):
+            if resource is not None:
+                continue
+            for code in known_resources:
+                self._filter_table.setdefault((role_id, code, action), scope_filter)
+
+    @property
+    def generation(self) -> Generation:
+        return Generation(self.epoch, self.version)
+
+    def get_rules(self, role_id: int, resource: str, action: str) -> Tuple[CompiledRule, ...]:
+        """Правила роли для ресурса, иначе правила без привязки к ресурсу"""
+        rules = self._index.get((role_id, resource, action))
+        if rules:
+            return rules
+        return self._index.get((role_id, None, action), ())
+
+    def scope_filter(self, role_id: int, resource: str, action: str) -> str:
+        """Тип фильтра списка FILTER_*"""
+        scope_filter = self._filter_table.get((role_id, resource, action))
+        if scope_filter is not None:
+            return scope_filter
+        # Ресурс, неизвестный при загрузке политики
+        return self._filter_table.get((role_id, None, action), FILTER_DENY)
+
+    def access_bits(self, role_id: int, resource: str, action: str) -> int:
+        """Биты ACCESS_* для тех же правил, что вернет get_rules"""
+        mask = self._role_masks.get(role_id, 0)
+        action_idx = self._action_index.get(action)
+        if not mask or action_idx is None:
+            return 0
+
+        resource_idx = self._resource_index.get(resource)
+        if resource_idx is not None:
+            bits = (mask >> (resource_idx * self._actions_count + action_idx) * _SLOT_BITS) & _SLOT_MASK
+            if bits:
+                return bits
+
+        return (mask >> action_idx * _SLOT_BITS) & _SLOT_MASK
+
+
+class _MappedKey:
+    """Ключ индекса снимка, правила компилируются при первом обращении"""
+
+    __slots__ = ('first', 'count', 'bits', 'scope_filter', 'rules')
+
+    def __init__(self, first: int, count: int, bits: int, scope_filter: str):
+        self.first = first
+        self.count = count
+        self.bits = bits
+        self.scope_filter = scope_filter
+        self.rules: Optional[Tuple[CompiledRule, ...]] = None
+
+
+class MappedPolicy:
+    """Политика, отвечающая на проверки из отображенного снимка
+
+    Интерфейс тот же, что у CompiledPolicy. Ключ (роль, ресурс, действие)
+    ищется двоичным поиском в индексе снимка и запоминается, биты и фильтр
+    ключа считаются по записям правил без разбора условий, а правила с
+    предикатами компилируются при первом вызове get_rules для ключа.
+    """
+
+    def __init__(self, view: SnapshotView):
+        self.view = view
+        self.version = view.generation.version
+        self.epoch = view.generation.epoch
+        self.resources = tuple(view.resources)
+        self.rules_count = view.rules_count
+        self._keys: Dict[int, _MappedKey] = {}
+        self._lookups: Dict[RuleKey, Optional[_MappedKey]] = {}
+
+    @property
+    def generation(self) -> Generation:
+        return Generation(self.epoch, self.version)
+
+    @property
+    def rules(self) -> Tuple[CompiledRule, ...]:
+        """Все правила снимка, проверки прав их не используют"""
+        return tuple(_compile_rule(self.view.rule_row(i)) for i in range(self.rules_count))
+
+    def get_rules(self, role_id: int, resource: str, action: str) -> Tuple[CompiledRule, ...]:
+        """Правила роли для ресурса, иначе правила без привязки к ресурсу"""
+        key = self._lookup(role_id, resource, action)
+        if key is None:
+            return ()
+        if key.rules is None:
+            key.rules = tuple(
+                _compile_rule(self.view.rule_row(i)) for i in range(key.first, key.first + key.count)
+            )
+        return key.rules
+
+    def scope_filter(self, role_id: int, resource: str, action: str) -> str:
+        """Тип фильтра списка FILTER_*"""
+        key = self._lookup(role_id, resource, action)
+        return FILTER_DENY if key is None else key.scope_filter
+
+    def access_bits(self, role_id: int, resource: str, action: str) -> int:
+        """Биты ACCESS_* для тех же правил, что вернет get_rules"""
+        key = self._lookup(role_id, resource, action)
+        return 0 if key is None else key.bits
+
+    def _lookup(self, role_id: int, resource: str, action: str) -> Optional[_MappedKey]:
+        lookup = (role_id, resource, action)
+        try:
+            return self._lookups[lookup]
+        except KeyError:
+            pass
+        key = self._find(role_id, resource, action) or self._find(role_id, None, action)
+        self._lookups[lookup] = key
+        return key
+
+    def _find(self, role_id: int, resource: Optional[str], action: str) -> Optional[_MappedKey]:
+        names = self.view.name_index
+        action_idx = names.get(action)
+        resource_idx = -1 if resource is None else names.get(resource)
+        if action_idx is None or resource_idx is None:
+            return None
+
+        found = self.view.find(role_id, resource_idx, action_idx)
+        if found is None:
+            return None
+        position, first, count = found
+
+        # Один ключ снимка отвечает и за ресурсы без своих правил
+        key = self._keys.get(position)
+        if key is None:
+            scopes = []
+            bits = 0
+            for i in range(first, first + count):
+                record = self.view.rule(i)
+                scope = self.view.names[record[6]]
+                scopes.append((scope, record[4] >= 0))
+                bits |= _rule_bits(scope)
+            key = self._keys[position] = _MappedKey(first, count, bits, _scope_filter(scopes))
+        return key
+
+
+# Политика процесса: скомпилированная из БД или из отображенного снимка
+Policy = Union[CompiledPolicy, MappedPolicy]
+
+
+def _rule_bits(scope: str) -> int:
+    bits = ACCESS_ANY
+    if scope == Scope.ALL:
+        bits |= ACCESS_ALL
+    elif scope == Scope.OWN:
+        bits |= ACCESS_OWN
+    return bits
+
+
+def _scope_filter(rules: Sequence[Tuple[str, bool]]) -> str:
+    """Фильтр списка по парам (scope, есть ли условия) правил ключа"""
+    if any(scope == Scope.ALL and not conditional for scope, conditional in rules):
+        return FILTER_ALL
+    if all(scope == Scope.OWN and not conditional for scope, conditional in rules):
+        return FILTER_OWN
+    return FILTER_RULES
+
+
+async def read_policy_version(db: AsyncSession) -> Generation:
+    result = await db.execute(
+        select(PolicyVersion.epoch, PolicyVersion.version)
+        .where(PolicyVersion.id == 1)
+        .execution_options(**READ_PRIMARY)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return Generation('', 0)
+    return Generation(row.epoch, row.version)
+
+
+async def load_policy(db: AsyncSession) -> CompiledPolicy:
+    """Загрузка поколения, всех правил и кодов ресурсов
+
+    Читается с основной БД: реплика может отставать от опубликованного
+    поколения, и политика перезагружалась бы на каждом запросе.
+    """
+    # Поколение читается до правил: при гонке с записью политика
+    # получит меньший номер и будет перезагружена повторно
+    generation = await read_policy_version(db)
+
+    stmt = (
+        select(
+            RolePermissionResource.id,
+            RolePermissionResource.role_id,
+            RolePermissionResource.permission_id,
+            RolePermissionResource.resource_id,
+            RolePermissionResource.conditions,
+            Permission.code,
+            Permission.scope,
+            Resource.code,
+        )
+        .join(RolePermissionResource.permission)
+        .outerjoin(RolePermissionResource.resource)
+        .execution_options(**READ_PRIMARY)
+    )
+    result = await db.execute(stmt)
+    rows = [tuple(row) for row in result.all()]
+
+    result = await db.execute(select(Resource.code).execution_options(**READ_PRIMARY))
+    resources = result.scalars().all()
+
+    return build_policy(generation.version, rows, resources, generation.epoch)
+
+
+def build_policy(
+    version: int,
+    rows: Sequence[RuleRow],
+    resources: Iterable[str],
+    epoch: str = ''
+) -> CompiledPolicy:
+    """Компиляция политики из строк правил"""
+    return CompiledPolicy([_compile_rule(row) for row in rows], version, resources, epoch)
+
+
+def _compile_rule(row: RuleRow) -> CompiledRule:
+    return CompiledRule(
+        id=row[0],
+        role_id=row[1],
+        permission_id=row[2],
+        resource_id=row[3],
+        conditions=row[4],
+        predicate=_compile_rule_conditions(row[0], row[4]),
+        action=row[5],
+        scope=row[6],
+        resource=row[7],
+    )
+
+
+def policy_rows(policy: Policy) -> List[RuleRow]:
+    return [
+        (
+            rule.id, rule.role_id, rule.permission_id, rule.resource_id,
+            rule.conditions, rule.action, rule.scope, rule.resource,
+        )
+        for rule in policy.rules
+    ]
+
+
+def _compile_rule_conditions(rule_id: int, conditions: Optional[Dict[str, Any]]) -> CompiledConditions:
+    try:
+        return compile_conditions(conditions)
+    except ValueError as e:
+        # Некорректное правило в БД ничего не разрешает
+        logger.warning('Некорректные условия правила id=%s: %s', rule_id, e)
+        return DENY_ALL
+
+
+class PolicyEngine:
+    """Хранит скомпилированную политику процесса"""
+
+    def __init__(
+        self,
+        bus: InvalidationBus,
+        snapshot: Optional[PolicySnapshot] = None,
+        version_poll_interval: float = 0.0
+    ):
+        self.bus = bus
+        self.snapshot = snapshot
+        self.version_poll_interval = version_poll_interval
+        self._policy: Optional[Policy] = None
+        self._reloading = False
+        self._version_checked_at = 0.0
+
+    async def get(self, db: AsyncSession) -> Policy:
+        """Актуальная политика из памяти"""
+        policy = self._policy
+        if policy is None:
+            return await self._reload(db)
+
+        # Пока один запрос перезагружает политику, остальные
+        # продолжают работать со старой версией
+        if self._reloading:
+            return policy
+
+        if self.bus.latest().supersedes(policy.generation):
+            return await self._reload(db)
+
+        # Изменения из процессов, до которых не доходит шина, видны
+        # по строке поколения в БД не позже чем через version_poll_interval
+        if self._version_check_due():
+            generation = await read_policy_version(db)
+            if generation.supersedes(policy.generation):
+                self.bus.publish(generation)
+                return await self._reload(db)
+
+        return policy
+
+    def _version_check_due(self) -> bool:
+        if self.version_poll_interval <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_poll_interval:
+            return False
+        # Отметка ставится до запроса: остальные запросы его не повторяют
+        self._version_checked_at = now
+        return True
+
+    def publish(self, generation: Generation) -> None:
+        """Оповещение всех процессов о новом поколении политики"""
+        self.bus.publish(generation)
+
+    def invalidate(self) -> None:
+        """Сброс политики, следующая проверка загрузит ее заново"""
+        self._policy = None
+
+    def reset(self) -> None:
+        """Полный сброс состояния, включая шину"""
+        self.bus.reset()
+        self.invalidate()
+
+    async def _reload(self, db: AsyncSession) -> Policy:
+        self._reloading = True
+        self._version_checked_at = time.monotonic()
+        try:
+            if self.snapshot is None:
+                policy = await load_policy(db)
+            else:
+                policy = await self._load_via_snapshot(db)
+        finally:
+            self._reloading = False
+
+        # Шина могла остаться от прежнего экземпляра БД: эпоха из БД
+        # заменяет ее, иначе каждый запрос перезагружал бы политику
+        if policy.epoch != self.bus.latest().epoch:
+            self.bus.publish(policy.generation)
+
+        # Замена ссылки атомарна, читатели видят либо старую, либо новую политику
+        current = self._policy
+        if current is None or policy.epoch != current.epoch or policy.version >= current.version:
+            self._policy = policy
+            return policy
+        return current
+
+    async def _load_via_snapshot(self, db: AsyncSession) -> Policy:
+        """Загрузка из общего снимка, из БД - только если снимок устарел"""
+        generation = await read_policy_version(db)
+        policy = self._from_snapshot(generation)
+        if policy is not None:
+            return policy
+
+        # Снимок строит один воркер, остальные ждут его, а не идут в БД
+        lock = self.snapshot.try_lock()
+        deadline = time.monotonic() + settings.POLICY_SNAPSHOT_WAIT
+        while lock is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            policy = self._from_snapshot(generation)
+            if policy is not None:
+                return policy
+            lock = self.snapshot.try_lock()
+
+        try:
+            policy = self._from_snapshot(generation) if lock is not None else None
+            if policy is None:
+                policy = await load_policy(db)
+                if lock is not None:
+                    self.snapshot.write(policy.generation, policy_rows(policy), policy.resources)
+                    # Воркер, построивший снимок, тоже отвечает из него
+                    policy = self._from_snapshot(policy.generation) or policy
+        finally:
+            if lock is not None:
+                self.snapshot.unlock(lock)
+        return policy
+
+    def _from_snapshot(self, generation: Generation) -> Optional[MappedPolicy]:
+        # Снимок другой эпохи построен по другому экземпляру БД
+        snapshot_generation = self.snapshot.generation()
+        if snapshot_generation is None or snapshot_generation.epoch != generation.epoch:
+            return None
+        if snapshot_generation.version < generation.version:
+            return None
+        view = self.snapshot.view()
+        if view is None or view.generation.epoch != generation.epoch:
+            return None
+        return MappedPolicy(view)
+
+
+def create_snapshot() -> Optional[PolicySnapshot]:
+    if settings.POLICY_SNAPSHOT_PATH:
+        return PolicySnapshot(settings.POLICY_SNAPSHOT_PATH)
+    return None
+
+
+policy_engine = PolicyEngine(create_bus(), create_snapshot(), settings.POLICY_VERSION_POLL_INTERVAL)
@@ -0,0 +1,118 @@
+from abc import ABC, abstractmethod
+from typing import NamedTuple
+import fcntl
+import os
+import time
+
+from app.core.config import settings
+
+
+class Generation(NamedTuple):
+    """Поколение политики: эпоха экземпляра БД и номер изменения в ней
+
+    Номера сравниваются только внутри одной эпохи. После пересоздания БД
+    номер начинается заново, а эпоха меняется.
+    """
+    epoch: str
+    version: int
+
+    def supersedes(self, other: 'Generation') -> bool:
+        """Другая эпоха заменяет текущую, в той же эпохе - только больший номер"""
+        return self.epoch != other.epoch or self.version > other.version
+
+
+INITIAL_GENERATION = Generation('', 0)
+
+
+class InvalidationBus(ABC):
+    """Рассылка поколения политики всем процессам"""
+
+    @abstractmethod
+    def publish(self, generation: Generation) -> None:
+        ...
+
+    @abstractmethod
+    def latest(self) -> Generation:
+        ...
+
+    @abstractmethod
+    def reset(self) -> None:
+        ...
+
+
+class InProcessBus(InvalidationBus):
+    """Шина в пределах одного процесса"""
+
+    def __init__(self):
+        self._generation = INITIAL_GENERATION
+
+    def publish(self, generation: Generation) -> None:
+        if generation.supersedes(self._generation):
+            self._generation = generation
+
+    def latest(self) -> Generation:
+        return self._generation
+
+    def reset(self) -> None:
+        self._generation = INITIAL_GENERATION
+
+
+class FileBus(InvalidationBus):
+    """Шина через локальный файл, общий для всех воркеров на хосте"""
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._generation = INITIAL_GENERATION
+        self._checked_at = 0.0
+
+    def publish(self, generation: Generation) -> None:
+        # Блокировка нужна только писателям, читатели файл не блокируют
+        with open(f'{self.path}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                current = self._read()
+                if not generation.supersedes(current):
+                    generation = current
+                tmp_path = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(f'{generation.epoch} {generation.version}')
+                os.replace(tmp_path, self.path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+        self._generation = generation
+        self._checked_at = time.monotonic()
+
+    def latest(self) -> Generation:
+        # Файл перечитывается не чаще poll_interval
+        now = time.monotonic()
+        if now - self._checked_at >= self.poll_interval:
+            generation = self._read()
+            if generation.supersedes(self._generation):
+                self._generation = generation
+            self._checked_at = now
+        return self._generation
+
+    def reset(self) -> None:
+        self._generation = INITIAL_GENERATION
+        self._checked_at = 0.0
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _read(self) -> Generation:
+        try:
+            with open(self.path) as f:
+                epoch, version = f.read().split()
+            return Generation(epoch, int(version))
+        except (FileNotFoundError, ValueError):
+            return INITIAL_GENERATION
+
+
+def create_bus(suffix: str = '') -> InvalidationBus:
+    """Шина по настройкам POLICY_BUS, suffix - отдельный канал в том же каталоге"""
+    if settings.POLICY_BUS == 'file':
+        return FileBus(settings.POLICY_BUS_PATH + suffix, settings.POLICY_BUS_POLL_INTERVAL)
+    return InProcessBus()
@@ -0,0 +1,308 @@
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+import fcntl
+import json
+import mmap
+import os
+import struct
+
+from app.core.policy_bus import Generation
+
+
+# Бинарный снимок политики доступа
+#
+# Заголовок: magic, версия формата, флаги, эпоха и номер поколения политики,
+# число строк, имен, правил, ключей и ресурсов. Далее таблица смещений строк,
+# сами строки (utf-8), записи правил фиксированного размера, сгруппированные
+# по ключу (роль, ресурс, действие), отсортированный индекс ключей и индексы
+# строк кодов ресурсов. Первые строки - имена (ресурсы, действия, scope),
+# за ними условия правил в JSON.
+#
+# Воркеры отвечают на проверки прямо из отображенного файла: ключ ищется
+# двоичным поиском по индексу, а правила ключа разбираются и условия
+# компилируются при первом обращении к нему. Общие страницы файла держит
+# ядро, в памяти воркера остаются только имена и использованные ключи.
+
+MAGIC = b'APOL'
+FORMAT_VERSION = 3
+
+HEADER = struct.Struct('<4sHH32sQIIIII')
+STRING_OFFSET = struct.Struct('<II')
+# id, role_id, permission_id, resource_id, conditions, action, scope, resource
+RULE = struct.Struct('<qqqqiiii')
+# role_id, resource, action, первое правило, число правил
+KEY = struct.Struct('<qiiII')
+STRING_INDEX = struct.Struct('<i')
+
+# Строка правила в порядке полей RULE (условия - dict или None)
+RuleRow = Tuple[int, int, int, Optional[int], Optional[dict], str, str, Optional[str]]
+
+# Запись правила из снимка: строки - индексы в таблице строк (-1 - нет значения)
+RuleRecord = Tuple[int, int, int, int, int, int, int, int]
+
+
+class SnapshotData(NamedTuple):
+    generation: Generation
+    rules: List[RuleRow]
+    resources: List[str]
+
+
+def encode_snapshot(
+    generation: Generation,
+    rules: Sequence[RuleRow],
+    resources: Iterable[str]
+) -> bytes:
+    resources = list(dict.fromkeys(resources))
+
+    # Правила одного ключа идут подряд, порядок внутри ключа сохраняется
+    groups: Dict[Tuple[int, Optional[str], str], List[RuleRow]] = {}
+    for row in rules:
+        groups.setdefault((row[1], row[7], row[5]), []).append(row)
+
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        idx = string_index.get(value)
+        if idx is None:
+            idx = string_index[value] = len(strings)
+            strings.append(value)
+        return idx
+
+    # Имена - в начале таблицы строк, воркер читает их сразу
+    for code in resources:
+        intern(code)
+    for row in rules:
+        intern(row[7])
+        intern(row[5])
+        intern(row[6])
+    names_count = len(strings)
+
+    records = []
+    keys = []
+    for (role_id, resource, action), group in groups.items():
+        keys.append((role_id, intern(resource), intern(action), len(records), len(group)))
+        for rule_id, _, permission_id, resource_id, conditions, _, scope, _ in group:
+            conditions_json = (
+                json.dumps(conditions, separators=(',', ':'), sort_keys=True) if conditions else None
+            )
+            records.append(RULE.pack(
+                rule_id, role_id, permission_id, -1 if resource_id is None else resource_id,
+                intern(conditions_json), intern(action), intern(scope), intern(resource),
+            ))
+    keys.sort()
+
+    encoded = [value.encode() for value in strings]
+    offsets = []
+    position = 0
+    for data in encoded:
+        offsets.append(STRING_OFFSET.pack(position, len(data)))
+        position += len(data)
+
+    parts = [HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, generation.epoch.encode(), generation.version,
+        len(strings), names_count, len(records), len(keys), len(resources)
+    )]
+    parts.extend(offsets)
+    parts.extend(encoded)
+    parts.extend(records)
+    parts.extend(KEY.pack(*key) for key in keys)
+    parts.extend(STRING_INDEX.pack(string_index[code]) for code in resources)
+    return b''.join(parts)
+
+
+def decode_header(buffer: Any) -> Tuple[Generation, int, int, int, int, int]:
+    """Поколение и размеры таблиц из заголовка снимка"""
+    (
+        magic, format_version, _, epoch, version,
+        strings_count, names_count, rules_count, keys_count, resources_count
+    ) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise ValueError('Неподдерживаемый формат снимка политики')
+    generation = Generation(epoch.rstrip(b'\0').decode(), version)
+    return generation, strings_count, names_count, rules_count, keys_count, resources_count
+
+
+class _KeyColumn:
+    """Ключи индекса как последовательность для bisect без копирования"""
+
+    def __init__(self, buffer: Any, offset: int, count: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i: int) -> Tuple[int, int, int]:
+        return KEY.unpack_from(self._buffer, self._offset + i * KEY.size)[:3]
+
+
+class SnapshotView:
+    """Чтение снимка из буфера по требованию
+
+    При создании проверяются размеры таблиц и читаются только имена и коды
+    ресурсов. Строки условий и записи правил разбираются при обращении.
+    """
+
+    def __init__(self, buffer: Any):
+        (
+            self.generation, strings_count, names_count,
+            self.rules_count, keys_count, resources_count
+        ) = decode_header(buffer)
+        self._buffer = buffer
+
+        self._offsets = HEADER.size
+        self._strings = self._offsets + strings_count * STRING_OFFSET.size
+        strings_size = 0
+        if strings_count:
+            position, length = STRING_OFFSET.unpack_from(
+                buffer, self._offsets + (strings_count - 1) * STRING_OFFSET.size
+            )
+            strings_size = position + length
+        self._rules = self._strings + strings_size
+        self._keys = self._rules + self.rules_count * RULE.size
+        resources_offset = self._keys + keys_count * KEY.size
+        if resources_offset + resources_count * STRING_INDEX.size != len(buffer):
+            raise ValueError('Размер снимка политики не совпадает с заголовком')
+
+        self.names = [self.string(idx) for idx in range(names_count)]
+        self.name_index = {name: idx for idx, name in enumerate(self.names)}
+        self.resources = [
+            self.string(STRING_INDEX.unpack_from(buffer, resources_offset + i * STRING_INDEX.size)[0])
+            for i in range(resources_count)
+        ]
+        self._key_column = _KeyColumn(buffer, self._keys, keys_count)
+
+    def string(self, idx: int) -> Optional[str]:
+        if idx < 0:
+            return None
+        position, length = STRING_OFFSET.unpack_from(self._buffer, self._offsets + idx * STRING_OFFSET.size)
+        start = self._strings + position
+        return bytes(self._buffer[start:start + length]).decode()
+
+    def find(self, role_id: int, resource_idx: int, action_idx: int) -> Optional[Tuple[int, int, int]]:
+        """Позиция ключа в индексе, первое правило и число правил, None - ключа нет"""
+        target = (role_id, resource_idx, action_idx)
+        position = bisect_left(self._key_column, target)
+        if position == len(self._key_column):
+            return None
+        key = KEY.unpack_from(self._buffer, self._keys + position * KEY.size)
+        if key[:3] != target:
+            return None
+        return position, key[3], key[4]
+
+    def rule(self, i: int) -> RuleRecord:
+        return RULE.unpack_from(self._buffer, self._rules + i * RULE.size)
+
+    def rule_row(self, i: int) -> RuleRow:
+        (
+            rule_id, role_id, permission_id, resource_id,
+            conditions_idx, action_idx, scope_idx, resource_idx
+        ) = self.rule(i)
+        conditions_json = self.string(conditions_idx)
+        return (
+            rule_id, role_id, permission_id, None if resource_id < 0 else resource_id,
+            json.loads(conditions_json) if conditions_json else None,
+            self.names[action_idx], self.names[scope_idx],
+            None if resource_idx < 0 else self.names[resource_idx],
+        )
+
+
+def decode_snapshot(buffer: Any) -> SnapshotData:
+    view = SnapshotView(buffer)
+    rules = [view.rule_row(i) for i in range(view.rules_count)]
+    return SnapshotData(view.generation, rules, view.resources)
+
+
+class PolicySnapshot:
+    """Снимок политики в файле, общий для воркеров на хосте
+
+    Файл отображается через mmap только для чтения, и политика отвечает на
+    проверки прямо из него (см. SnapshotView).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mmap: Optional[mmap.mmap] = None
+        self._file_id: Optional[tuple] = None
+
+    def generation(self) -> Optional[Generation]:
+        """Поколение политики в снимке, None - снимка нет"""
+        buffer = self._map()
+        if buffer is None:
+            return None
+        try:
+            return decode_header(buffer)[0]
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def view(self) -> Optional[SnapshotView]:
+        """Текущий снимок без разбора правил, None - снимка нет или он поврежден"""
+        buffer = self._map()
+        if buffer is None:
+            return None
+        try:
+            return SnapshotView(buffer)
+        except (ValueError, struct.error, IndexError, UnicodeDecodeError):
+            return None
+
+    def read(self) -> Optional[SnapshotData]:
+        buffer = self._map()
+        if buffer is None:
+            return None
+        try:
+            return decode_snapshot(buffer)
+        except (ValueError, struct.error, IndexError, UnicodeDecodeError):
+            return None
+
+    def write(
+        self,
+        generation: Generation,
+        rules: Sequence[RuleRow],
+        resources: Iterable[str]
+    ) -> None:
+        """Атомарная замена файла снимка"""
+        data = encode_snapshot(generation, rules, resources)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def try_lock(self) -> Optional[Any]:
+        """Неблокирующий захват права на построение снимка"""
+        lock = open(f'{self.path}.lock', 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    @staticmethod
+    def unlock(lock: Any) -> None:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+        lock.close()
+
+    def _map(self) -> Optional[mmap.mmap]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        # Новый снимок заменяет файл целиком, поэтому меняется inode.
+        # Прежнее отображение не закрывается: его может держать политика,
+        # которой еще пользуются запросы, оно освободится вместе с ней
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id != self._file_id:
+            self._mmap = None
+            if stat.st_size < HEADER.size:
+                self._file_id = None
+                return None
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._file_id = file_id
+
+        return self._mmap
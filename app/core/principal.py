@@ -0,0 +1,104 @@
+from typing import Any, Dict, Optional
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import SingleFlight, TTLCache
+from app.core.config import settings
+from app.core.database import READ_PRIMARY
+from app.core.stamps import create_stamps
+from app.models import User
+
+
+# Кэш пользователей для проверки токенов по БД: id -> (role_id, is_active, время загрузки)
+principal_cache = TTLCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
+_principal_loads = SingleFlight()
+
+
+# Время последнего изменения пользователя по id, общее для воркеров
+principal_evictions = create_stamps('.principals')
+
+
+class Principal:
+    """Текущий пользователь запроса без загрузки строки из БД"""
+
+    __slots__ = ('id', 'role_id', 'is_active', '_user')
+
+    def __init__(
+        self,
+        id: int,
+        role_id: int,
+        is_active: bool = True,
+        user: Optional[User] = None
+    ):
+        self.id = id
+        self.role_id = role_id
+        self.is_active = is_active
+        self._user = user
+
+    @classmethod
+    def from_user(cls, user: User) -> 'Principal':
+        return cls(user.id, user.role_id, user.is_active, user=user)
+
+    @classmethod
+    def from_claims(cls, payload: Dict[str, Any]) -> Optional['Principal']:
+        """Principal из подписанных claims токена, None - claims неполные"""
+        user_id = payload.get('sub')
+        role_id = payload.get('role_id')
+        is_active = payload.get('active')
+        if user_id is None or role_id is None or is_active is None:
+            return None
+        return cls(int(user_id), int(role_id), bool(is_active))
+
+    async def load(self, db: AsyncSession) -> Optional[User]:
+        """Полный пользователь из БД, загружается один раз по требованию"""
+        if self._user is None:
+            self._user = await db.get(User, self.id)
+        return self._user
+
+
+async def get_principal(db: AsyncSession, user_id: int) -> Optional[Principal]:
+    """Пользователь по id из кэша, одновременные промахи выполняют один запрос"""
+    cached = principal_cache.get(user_id)
+    if cached is None or _evicted(user_id, cached):
+        cached = await _principal_loads.do(user_id, lambda: _load_principal(db, user_id))
+        if cached is not None and _evicted(user_id, cached):
+            # Общая загрузка началась до изменения пользователя
+            cached = await _load_principal(db, user_id)
+    if cached is None:
+        return None
+
+    role_id, is_active, _ = cached
+    return Principal(user_id, role_id, is_active)
+
+
+def _evicted(user_id: int, cached: tuple) -> bool:
+    """Пользователь изменен после начала загрузки записи кэша"""
+    evicted_at = principal_evictions.get(user_id)
+    return evicted_at is not None and evicted_at >= cached[2]
+
+
+async def _load_principal(db: AsyncSession, user_id: int) -> Optional[tuple]:
+    # Время фиксируется до запроса: изменение, закоммиченное во время
+    # загрузки, получит отметку не раньше и сделает запись устаревшей
+    loaded_at = time.time_ns()
+    result = await db.execute(
+        # Удаление или смена роли должны действовать сразу, реплика может отставать
+        select(User.role_id, User.is_active)
+        .where(User.id == user_id)
+        .execution_options(**READ_PRIMARY)
+    )
+    row = result.one_or_none()
+    if row is None:
+        return None
+
+    cached = (row.role_id, row.is_active, loaded_at)
+    principal_cache.set(user_id, cached)
+    return cached
+
+
+def evict_principal(user_id: int) -> None:
+    """Сброс записи пользователя после коммита, другие процессы видят отметку"""
+    principal_cache.pop(user_id)
+    principal_evictions.touch(user_id)
@@ -0,0 +1,62 @@
+from typing import Any, Callable, Optional
+
+import jwt
+from starlette.requests import HTTPConnection
+
+from app.core import security
+from app.core.database import WriteMarker, write_marker
+from app.core.stamps import create_stamps
+
+
+# Время последней записи по id пользователя, общее для воркеров
+last_writes = create_stamps('.writes')
+
+
+def request_principal_id(connection: HTTPConnection) -> Optional[str]:
+    """id пользователя из Bearer токена запроса, None - токена нет или он неверный"""
+    scheme, _, token = connection.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        payload = security.decode_token(token)
+    except jwt.PyJWTError:
+        return None
+    sub = str(payload.get('sub', ''))
+    return sub if sub.isdigit() else None
+
+
+class ReadYourWritesMiddleware:
+    """Время последней записи пользователя в хранилище, общем для воркеров
+
+    Запрос получает WriteMarker со временем последней записи пользователя
+    из токена. Если в запросе была запись, время сохраняется до отправки
+    ответа, и следующий запрос на любом воркере читает с основной БД в
+    течение DB_READ_YOUR_WRITES_WINDOW. Анонимные запросы не отслеживаются.
+    """
+
+    def __init__(self, app: Callable[..., Any]):
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        principal_id = request_principal_id(HTTPConnection(scope))
+        if principal_id is None:
+            await self.app(scope, receive, send)
+            return
+
+        last_write = last_writes.get(principal_id)
+        marker = WriteMarker(last_write / 1e9 if last_write else 0.0)
+
+        async def send_after_write(message: dict) -> None:
+            if message['type'] == 'http.response.start' and marker.wrote:
+                last_writes.touch(principal_id)
+            await send(message)
+
+        token = write_marker.set(marker)
+        try:
+            await self.app(scope, receive, send_after_write)
+        finally:
+            write_marker.reset(token)
@@ -0,0 +1,121 @@
+from typing import Dict, Optional
+import hashlib
+import math
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import crud
+from app.core.config import settings
+
+
+class BloomFilter:
+    """Bloom фильтр строк: без ложных отрицаний, ложные срабатывания с долей error_rate"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, value: str) -> None:
+        for pos in self._positions(value):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+
+
+class RevocationList:
+    """Отозванные токены в памяти процесса
+
+    Проверка идет через Bloom фильтр, положительные ответы уточняются по
+    точному словарю jti -> exp. Записи удаляются после истечения токена,
+    изменения из БД подтягиваются не чаще sync_interval.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, sync_interval: float):
+        self.initial_capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.reset()
+
+    def reset(self) -> None:
+        self._bloom = BloomFilter(self.initial_capacity, self.error_rate)
+        self._revoked: Dict[str, int] = {}
+        self._last_id = 0
+        self._synced_at: Optional[float] = None
+        self._syncing = False
+
+    def add(self, jti: str, expires_at: int) -> None:
+        if jti in self._revoked:
+            return
+        self._revoked[jti] = expires_at
+        if self._bloom.count >= self._bloom.capacity:
+            self._rebuild()
+        else:
+            self._bloom.add(jti)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None or jti not in self._bloom:
+            return False
+
+        expires_at = self._revoked.get(jti)
+        if expires_at is None:
+            return False  # Ложное срабатывание фильтра
+        if expires_at <= time.time():
+            # Истекший токен отклоняется при декодировании
+            del self._revoked[jti]
+            return False
+        return True
+
+    def purge(self) -> None:
+        """Удаление истекших записей и пересборка фильтра"""
+        now = time.time()
+        revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        if len(revoked) != len(self._revoked) or self._bloom.count > len(revoked):
+            self._revoked = revoked
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        capacity = self.initial_capacity
+        while capacity < len(self._revoked) * 2:
+            capacity *= 2
+        self._bloom = BloomFilter(capacity, self.error_rate)
+        for jti in self._revoked:
+            self._bloom.add(jti)
+
+    async def sync(self, db: AsyncSession) -> None:
+        """Подтягивает новые отзывы из БД, не чаще sync_interval"""
+        now = time.monotonic()
+        if self._syncing:
+            return
+        if self._synced_at is not None and now - self._synced_at < self.sync_interval:
+            return
+
+        self._syncing = True
+        try:
+            self.purge()
+            for row in await crud.token.get_revoked_since(db, last_id=self._last_id):
+                self.add(row.jti, row.expires_at)
+                self._last_id = max(self._last_id, row.id)
+            self._synced_at = now
+        finally:
+            self._syncing = False
+
+
+revocation_list = RevocationList(
+    settings.REVOCATION_BLOOM_CAPACITY,
+    settings.REVOCATION_BLOOM_ERROR_RATE,
+    settings.REVOCATION_SYNC_INTERVAL,
+)
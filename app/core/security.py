@@ -1,24 +1,92 @@
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import time
+import uuid
 
 from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
 import jwt
 
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.keys import key_ring
 from app.models.user import User
 
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Уже проверенные токены: sha256 токена -> payload, запись живет до exp токена
+token_cache = TTLCache(settings.TOKEN_CACHE_SIZE, ttl=0)
+key_ring.on_rotate(token_cache.clear)
+
+
+def create_password_context(schemes: List[str], rounds: Optional[int] = None) -> CryptContext:
+    """Контекст хэширования: первая схема основная, остальные устаревшие
+
+    При заданном rounds хэши основной схемы с меньшей стоимостью
+    считаются устаревшими и перехэшируются при входе.
+    """
+    # Без библиотеки схемы passlib падает только на первом хэше, поэтому
+    # недоступная схема - ошибка запуска, а не входа пользователя
+    for scheme in schemes:
+        if not get_crypt_handler(scheme).has_backend():
+            raise RuntimeError(f'Схема хэширования {scheme} недоступна: не установлена ее библиотека')
+
+    options: Dict[str, Any] = {}
+    if rounds is not None:
+        options[f'{schemes[0]}__default_rounds'] = rounds
+        options[f'{schemes[0]}__min_rounds'] = rounds
+    return CryptContext(schemes=schemes, deprecated="auto", **options)
+
+
+pwd_context = create_password_context(settings.PASSWORD_SCHEMES, settings.PASSWORD_ROUNDS)
 
 
 def verify_password(password_for_verification: str, hashed_password: str) -> bool:
     return pwd_context.verify(password_for_verification, hashed_password)
 
 
+def verify_and_update_password(
+    password_for_verification: str,
+    hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Проверка пароля и новый хэш, если текущий устарел"""
+    return pwd_context.verify_and_update(password_for_verification, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def calibrate_password_hashing(target_ms: float) -> int:
+    """Подбирает стоимость основной схемы под целевое время проверки
+
+    Выбирается наибольшая стоимость, хэш с которой укладывается в target_ms
+    на текущем оборудовании.
+    """
+    global pwd_context
+
+    schemes = settings.PASSWORD_SCHEMES
+    handler = get_crypt_handler(schemes[0])
+    if not handler.has_backend():
+        raise RuntimeError(f'Схема хэширования {schemes[0]} недоступна')
+
+    rounds = handler.min_rounds
+    for candidate in range(handler.min_rounds, handler.max_rounds + 1):
+        started = time.perf_counter()
+        handler.using(rounds=candidate).hash('calibration')
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms > target_ms:
+            break
+        rounds = candidate
+
+    pwd_context = create_password_context(schemes, rounds)
+    logger.info('Стоимость хэширования %s: rounds=%s', schemes[0], rounds)
+    return rounds
+
+
 def access_token_expires() -> int:
     minutes = settings.ACCESS_TOKEN_EXPIRE_MINUTES
     return expires_timestamp(timedelta(minutes=minutes))
@@ -33,18 +101,32 @@ def create_access_token(user: User) -> str:
     token_payload: Dict[str, Any] = {
         "sub": str(user.id),
         "type": "access",
-        "exp": access_token_expires()
+        "exp": access_token_expires(),
+        "jti": uuid.uuid4().hex,
+        # Claims текущего пользователя, чтобы не загружать его из БД
+        "role_id": user.role_id,
+        "active": user.is_active,
     }
 
-    access_token = jwt.encode(token_payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    access_token = key_ring.encode(token_payload)
     return access_token
 
 
+def decode_token(token: str) -> Dict[str, Any]:
+    """Проверка подписи и срока действия, ошибки - исключения jwt"""
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(digest)
+    if payload is None:
+        payload = key_ring.decode(token)
+        exp = payload.get("exp")
+        # Токены без срока действия не кэшируются
+        if isinstance(exp, (int, float)):
+            token_cache.set(digest, payload, ttl=exp - time.time())
+    return dict(payload)
+
+
 def verify_token(token: str) -> dict:
     try:
-        payload = jwt.decode(
-            token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
-        )
-        return payload
+        return decode_token(token)
     except jwt.PyJWTError:
         return {}
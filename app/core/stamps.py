@@ -0,0 +1,99 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Hashable, Optional
+import fcntl
+import os
+import time
+
+from app.core.config import settings
+
+
+class StampStore(ABC):
+    """Время последнего события по ключу, общее для всех процессов
+
+    Время - time.time_ns() на момент touch. Процесс сравнивает его со своим
+    временем (например, начала загрузки записи в кэш), поэтому хранилище
+    должно быть общим для воркеров, которые это сравнение делают.
+    """
+
+    @abstractmethod
+    def touch(self, key: Hashable) -> int:
+        ...
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    def reset(self) -> None:
+        ...
+
+
+class InProcessStamps(StampStore):
+    """Отметки в пределах одного процесса"""
+
+    def __init__(self):
+        self._stamps: Dict[Hashable, int] = {}
+
+    def touch(self, key: Hashable) -> int:
+        stamp = self._stamps[key] = time.time_ns()
+        return stamp
+
+    def get(self, key: Hashable) -> Optional[int]:
+        return self._stamps.get(key)
+
+    def reset(self) -> None:
+        self._stamps.clear()
+
+
+class FileStamps(StampStore):
+    """Отметки в каталоге на локальном диске: файл на ключ
+
+    Время берется под блокировкой каталога, поэтому более поздняя отметка
+    всегда больше. Читатели файлы не блокируют, запись атомарная.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def touch(self, key: Hashable) -> int:
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                stamp = time.time_ns()
+                path = self._key_path(key)
+                tmp_path = f'{path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(str(stamp))
+                os.replace(tmp_path, path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return stamp
+
+    def get(self, key: Hashable) -> Optional[int]:
+        try:
+            with open(self._key_path(key)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def reset(self) -> None:
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return
+        for name in names:
+            try:
+                os.remove(os.path.join(self.path, name))
+            except FileNotFoundError:
+                pass
+
+    def _key_path(self, key: Hashable) -> str:
+        return os.path.join(self.path, str(key))
+
+
+def create_stamps(suffix: str) -> StampStore:
+    """Хранилище по настройкам POLICY_BUS, suffix - каталог рядом с файлом шины"""
+    if settings.POLICY_BUS == 'file':
+        return FileStamps(settings.POLICY_BUS_PATH + suffix)
+    return InProcessStamps()
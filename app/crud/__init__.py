@@ -1 +1 @@
-from . import user, order, product, permission
+from . import user, order, product, permission, token
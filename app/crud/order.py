@@ -1,7 +1,8 @@
 from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete as sql_delete, insert, select, update as sql_update
+from sqlalchemy.sql import ColumnElement
 
 from app.models import Order
 
@@ -11,33 +12,68 @@ async def get(db: AsyncSession, order_id: int) -> Optional[Order]:
     return result.scalar_one_or_none()
 
 
-async def create(db: AsyncSession, *, user_id: int, order_data: dict) -> Order:
-    order = Order(owner_id=user_id, status='pending')
+async def exists(db: AsyncSession, order_id: int) -> bool:
+    result = await db.execute(select(Order.id).where(Order.id == order_id))
+    return result.scalar_one_or_none() is not None
+
 
-    db.add(order)
+async def create(db: AsyncSession, *, user_id: int, order_data: dict) -> Order:
+    # Заказ возвращается тем же запросом, без refresh после commit
+    result = await db.execute(
+        insert(Order).values(owner_id=user_id, status='pending').returning(Order)
+    )
+    order = result.scalar_one()
     await db.commit()
-    await db.refresh(order)
     return order
 
 
-async def update(db: AsyncSession, *, order_id: int, update_data: dict) -> Optional[Order]:
-    order = await get(db, order_id)
-    if not order:
-        return None
+async def update(
+    db: AsyncSession,
+    *,
+    order_id: int,
+    update_data: dict,
+    scope: Optional[ColumnElement[bool]] = None
+) -> Optional[Order]:
+    """Обновление одним запросом, scope - условие прав доступа в WHERE"""
+    criteria = [Order.id == order_id]
+    if scope is not None:
+        criteria.append(scope)
 
-    # Обновление
-    for field in update_data:
-        if hasattr(order, field) and field != 'id':
-            setattr(order, field, update_data[field])
+    values = {
+        field: value for field, value in update_data.items()
+        if field in Order.__table__.c and field != 'id'
+    }
+    if not values:
+        result = await db.execute(select(Order).where(*criteria))
+        return result.scalar_one_or_none()
 
-    db.add(order)
+    # Обновление
+    result = await db.execute(
+        sql_update(Order)
+        .where(*criteria)
+        .values(**values)
+        .returning(Order)
+        .execution_options(populate_existing=True)
+    )
+    order = result.scalar_one_or_none()
     await db.commit()
-    await db.refresh(order)
     return order
 
 
-async def delete(db: AsyncSession, *, order_id: int) -> None:
-    order = await get(db, order_id)
-    if order:
-        db.delete(order)
-        await db.commit()
+async def delete(
+    db: AsyncSession,
+    *,
+    order_id: int,
+    scope: Optional[ColumnElement[bool]] = None
+) -> bool:
+    """Удаление одним запросом, False - заказ не найден или не прошел scope"""
+    stmt = sql_delete(Order).where(Order.id == order_id)
+    if scope is not None:
+        stmt = stmt.where(scope)
+
+    result = await db.execute(
+        stmt.returning(Order.id)
+    )
+    deleted = result.scalar_one_or_none() is not None
+    await db.commit()
+    return deleted
@@ -1,9 +1,16 @@
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_
+from sqlalchemy import insert, select, update, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.models import RolePermissionResource, Role, Permission, Resource
+from app.core.conditions import CompiledConditions, compile_conditions
+from app.core.database import Base
+from app.core.policy import policy_engine
+from app.core.policy_bus import Generation
+from app.models import RolePermissionResource, Role, Permission, Resource, PolicyVersion
 from app.schemas.permission import RuleCreate, RuleUpdate
 
 
@@ -110,6 +117,78 @@ async def get_rules(
     return result.scalars().all()
 
 
+async def attach_relations(db: AsyncSession, rule: RolePermissionResource) -> None:
+    """Связанные объекты правила для ответа
+
+    Роли, разрешения и ресурсы берутся из identity map сессии, запрос
+    выполняется только для еще не загруженных объектов.
+    """
+    role = await db.get(Role, rule.role_id)
+    permission = await db.get(Permission, rule.permission_id)
+    resource = await db.get(Resource, rule.resource_id) if rule.resource_id else None
+
+    set_committed_value(rule, 'role', role)
+    set_committed_value(rule, 'permission', permission)
+    set_committed_value(rule, 'resource', resource)
+
+
+def _resource_fields(code: str) -> Optional[List[str]]:
+    """Колонки и hybrid-поля модели ресурса, код ресурса совпадает с именем таблицы"""
+    for mapper in Base.registry.mappers:
+        if mapper.local_table.name == code:
+            hybrids = [
+                key for key, attr in mapper.all_orm_descriptors.items()
+                if isinstance(attr, hybrid_property)
+            ]
+            return list(mapper.columns.keys()) + hybrids
+    return None
+
+
+async def _check_condition_fields(
+    db: AsyncSession,
+    resource_id: Optional[int],
+    conditions: CompiledConditions
+) -> None:
+    """Поля условий должны быть полями ресурса, иначе правило ничего не разрешит"""
+    if not resource_id or not conditions:
+        return
+
+    resource = await db.get(Resource, resource_id)
+    if not resource:
+        return
+
+    fields = _resource_fields(resource.code) or []
+    unknown = [field for field in conditions.fields if field not in fields]
+    if unknown:
+        raise ValueError(f"У ресурса {resource.code} нет полей: {', '.join(unknown)}")
+
+
+async def bump_policy_version(db: AsyncSession) -> Generation:
+    """Увеличить поколение политики в текущей транзакции"""
+    row = await _increment_policy_version(db)
+    if row is None:
+        # Строка создается вместе с таблицей. Если ее все же нет, вставка
+        # идет в savepoint: при гонке первых писателей проигравший получает
+        # IntegrityError и увеличивает строку, вставленную другим
+        try:
+            async with db.begin_nested():
+                db.add(PolicyVersion(id=1, version=0))
+        except IntegrityError:
+            pass
+        row = await _increment_policy_version(db)
+    return Generation(row.epoch, row.version)
+
+
+async def _increment_policy_version(db: AsyncSession):
+    result = await db.execute(
+        update(PolicyVersion)
+        .where(PolicyVersion.id == 1)
+        .values(version=PolicyVersion.version + 1)
+        .returning(PolicyVersion.epoch, PolicyVersion.version)
+    )
+    return result.one_or_none()
+
+
 async def create_rule(
     db: AsyncSession,
     *,
@@ -128,6 +207,9 @@ async def create_rule(
     if existing:
         raise ValueError('Такое правило уже существует')
 
+    # Условия проверяются при создании, а не при проверке прав
+    conditions = compile_conditions(rule_data.conditions)
+
     # Проверяем существование связанных объектов
     role = await db.get(Role, rule_data.role_id)
     if not role:
@@ -142,21 +224,23 @@ async def create_rule(
         if not resource:
             raise ValueError(f"Ресурс с id={rule_data.resource_id} не найден")
 
+        await _check_condition_fields(db, rule_data.resource_id, conditions)
+
     # Создаем новое правило
-    rule = RolePermissionResource(
-        role_id=rule_data.role_id,
-        permission_id=rule_data.permission_id,
-        resource_id=rule_data.resource_id,
-        conditions=rule_data.conditions
+    result = await db.execute(
+        insert(RolePermissionResource).values(
+            role_id=rule_data.role_id,
+            permission_id=rule_data.permission_id,
+            resource_id=rule_data.resource_id,
+            conditions=rule_data.conditions
+        ).returning(RolePermissionResource)
     )
-
-    db.add(rule)
+    rule = result.scalar_one()
+    generation = await bump_policy_version(db)
     await db.commit()
-    await db.refresh(rule)
-
-    # Загружаем связанные объекты для возврата
-    await db.refresh(rule, ['role', 'permission', 'resource'])
+    policy_engine.publish(generation)
 
+    await attach_relations(db, rule)
     return rule
 
 
@@ -167,23 +251,35 @@ async def update_rule(
     rule_data: RuleUpdate
 ) -> Optional[RolePermissionResource]:
     """Обновить правило"""
-    rule = await get_rule(db, id=id, load_relations=False)
-    if not rule:
-        return None
-
     # Обновляем только разрешенные поля
     update_data = rule_data.dict(exclude_unset=True)
 
-    for field, value in update_data.items():
-        setattr(rule, field, value)
+    if 'conditions' in update_data:
+        conditions = compile_conditions(update_data['conditions'])
+        # Правило обычно уже загружено в сессию обработчиком
+        rule = await db.get(RolePermissionResource, id)
+        if rule:
+            await _check_condition_fields(db, rule.resource_id, conditions)
+
+    if not update_data:
+        return await get_rule(db, id=id)
+
+    result = await db.execute(
+        update(RolePermissionResource)
+        .where(RolePermissionResource.id == id)
+        .values(**update_data)
+        .returning(RolePermissionResource)
+    )
+    rule = result.scalar_one_or_none()
+    if not rule:
+        await db.rollback()
+        return None
 
-    db.add(rule)
+    generation = await bump_policy_version(db)
     await db.commit()
-    await db.refresh(rule)
-
-    # Загружаем связанные объекты для возврата
-    await db.refresh(rule, ['role', 'permission', 'resource'])
+    policy_engine.publish(generation)
 
+    await attach_relations(db, rule)
     return rule
 
 
@@ -194,6 +290,8 @@ async def delete_rule(db: AsyncSession, *, id: int) -> bool:
         return False
 
     await db.delete(rule)
+    generation = await bump_policy_version(db)
     await db.commit()
+    policy_engine.publish(generation)
 
     return True
@@ -1,7 +1,8 @@
 from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import delete as sql_delete, insert, select, update as sql_update
+from sqlalchemy.sql import ColumnElement
 
 from app.models import Product
 
@@ -11,33 +12,68 @@ async def get(db: AsyncSession, product_id: int) -> Optional[Product]:
     return result.scalar_one_or_none()
 
 
-async def create(db: AsyncSession, *, user_id: int, product_data: dict) -> Product:
-    product = Product(owner_id=user_id, name=product_data.get('name'))
+async def exists(db: AsyncSession, product_id: int) -> bool:
+    result = await db.execute(select(Product.id).where(Product.id == product_id))
+    return result.scalar_one_or_none() is not None
+
 
-    db.add(product)
+async def create(db: AsyncSession, *, user_id: int, product_data: dict) -> Product:
+    # Товар возвращается тем же запросом, без refresh после commit
+    result = await db.execute(
+        insert(Product).values(owner_id=user_id, name=product_data.get('name')).returning(Product)
+    )
+    product = result.scalar_one()
     await db.commit()
-    await db.refresh(product)
     return product
 
 
-async def update(db: AsyncSession, *, product_id: int, update_data: dict) -> Optional[Product]:
-    product = await get(db, product_id)
-    if not product:
-        return None
+async def update(
+    db: AsyncSession,
+    *,
+    product_id: int,
+    update_data: dict,
+    scope: Optional[ColumnElement[bool]] = None
+) -> Optional[Product]:
+    """Обновление одним запросом, scope - условие прав доступа в WHERE"""
+    criteria = [Product.id == product_id]
+    if scope is not None:
+        criteria.append(scope)
 
-    # Обновление
-    for field in update_data:
-        if hasattr(product, field) and field != 'id':
-            setattr(product, field, update_data[field])
+    values = {
+        field: value for field, value in update_data.items()
+        if field in Product.__table__.c and field != 'id'
+    }
+    if not values:
+        result = await db.execute(select(Product).where(*criteria))
+        return result.scalar_one_or_none()
 
-    db.add(product)
+    # Обновление
+    result = await db.execute(
+        sql_update(Product)
+        .where(*criteria)
+        .values(**values)
+        .returning(Product)
+        .execution_options(populate_existing=True)
+    )
+    product = result.scalar_one_or_none()
     await db.commit()
-    await db.refresh(product)
     return product
 
 
-async def delete(db: AsyncSession, *, product_id: int) -> None:
-    product = await get(db, product_id)
-    if product:
-        db.delete(product)
-        await db.commit()
+async def delete(
+    db: AsyncSession,
+    *,
+    product_id: int,
+    scope: Optional[ColumnElement[bool]] = None
+) -> bool:
+    """Удаление одним запросом, False - товар не найден или не прошел scope"""
+    stmt = sql_delete(Product).where(Product.id == product_id)
+    if scope is not None:
+        stmt = stmt.where(scope)
+
+    result = await db.execute(
+        stmt.returning(Product.id)
+    )
+    deleted = result.scalar_one_or_none() is not None
+    await db.commit()
+    return deleted
@@ -0,0 +1,29 @@
+from typing import List
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, select
+
+from app.core.database import READ_PRIMARY
+from app.models import RevokedToken
+
+
+async def revoke(db: AsyncSession, *, jti: str, expires_at: int) -> None:
+    # Истекшие записи больше не нужны
+    await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= int(time.time())))
+
+    exists = await db.execute(select(RevokedToken.id).where(RevokedToken.jti == jti))
+    if exists.scalar_one_or_none() is None:
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
+    await db.commit()
+
+
+async def get_revoked_since(db: AsyncSession, *, last_id: int) -> List[RevokedToken]:
+    """Действующие отзывы, добавленные после записи last_id"""
+    result = await db.execute(
+        select(RevokedToken)
+        .where(RevokedToken.id > last_id, RevokedToken.expires_at > int(time.time()))
+        .order_by(RevokedToken.id)
+        .execution_options(**READ_PRIMARY)
+    )
+    return result.scalars().all()
@@ -1,12 +1,15 @@
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import insert, select, update as sql_update
+from sqlalchemy.sql import ColumnElement
+from sqlalchemy.sql.elements import False_
 
-from app.core import security
-from app.models import User
+from app.core.hashing import password_hasher
+from app.core.principal import evict_principal
+from app.models import Role, User
 from app.schemas import UserCreate, UserUpdate
-from app.crud.permission import get_default_user_role_id
 
 
 async def get(
@@ -24,22 +27,72 @@ async def get(
 
 
 async def create(db: AsyncSession, *, user_data: UserCreate) -> User:
-    hashed_password = security.get_password_hash(user_data.password)
-    role_id = await get_default_user_role_id(db)
+    hashed_password = await password_hasher.hash(user_data.password)
 
-    user = User(
+    # Роль по умолчанию подставляется подзапросом, пользователь возвращается
+    # тем же INSERT
+    stmt = insert(User).values(
         email=user_data.email,
         hashed_password=hashed_password,
         first_name=user_data.first_name,
         middle_name=user_data.middle_name,
         last_name=user_data.last_name,
         is_active=True,
-        role_id=role_id
-    )
+        role_id=select(Role.id).where(Role.code == 'user').scalar_subquery()
+    ).returning(User)
+
+    try:
+        result = await db.execute(stmt)
+        user = result.scalar_one()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        # Нарушение другого ограничения (например, нет роли user) - не ошибка клиента
+        if await get(db, email=user_data.email) is None:
+            raise
+        raise ValueError('Пользователь с таким email уже существует')
+    return user
+
 
-    db.add(user)
+async def exists(db: AsyncSession, *, user_id: int) -> bool:
+    result = await db.execute(select(User.id).where(User.id == user_id))
+    return result.scalar_one_or_none() is not None
+
+
+async def _exists_in_scope(
+    db: AsyncSession,
+    user_id: int,
+    scope: Optional[ColumnElement[bool]] = None
+) -> bool:
+    if isinstance(scope, False_):
+        return False
+
+    query = select(User.id).where(User.id == user_id)
+    if scope is not None:
+        query = query.where(scope)
+    result = await db.execute(query)
+    return result.scalar_one_or_none() is not None
+
+
+async def _update_fields(
+    db: AsyncSession,
+    user_id: int,
+    values: dict,
+    scope: Optional[ColumnElement[bool]] = None
+) -> Optional[User]:
+    """UPDATE ... RETURNING, scope - условие прав доступа в WHERE"""
+    stmt = sql_update(User).where(User.id == user_id)
+    if scope is not None:
+        stmt = stmt.where(scope)
+
+    result = await db.execute(
+        stmt
+        .values(**values)
+        .returning(User)
+        .execution_options(populate_existing=True)
+    )
+    user = result.scalar_one_or_none()
     await db.commit()
-    await db.refresh(user)
     return user
 
 
@@ -47,31 +100,38 @@ async def update(
     db: AsyncSession,
     *,
     user_id: int,
-    update_data: UserUpdate
+    update_data: UserUpdate,
+    scope: Optional[ColumnElement[bool]] = None
 ) -> Optional[User]:
-    user = await get(db, user_id=user_id)
-    if not user:
-        return None
-
     update_data = update_data.model_dump(exclude_unset=True)
 
-    # Обновление хэша пароля
+    # Обновление хэша пароля. Хэширование дорогое, поэтому сначала
+    # проверяем, что пользователь существует и проходит условие прав
     if update_data.get('password'):
-        hashed_password = security.get_password_hash(update_data['password'])
+        if not await _exists_in_scope(db, user_id, scope):
+            return None
+        hashed_password = await password_hasher.hash(update_data['password'])
         update_data["hashed_password"] = hashed_password
 
     # Удаление полей пороля
     update_data.pop("password", None)
     update_data.pop("password_confirm", None)
 
-    # Обновление
-    for field in update_data:
-        if hasattr(user, field) and field != 'id':
-            setattr(user, field, update_data[field])
+    values = {
+        field: value for field, value in update_data.items()
+        if field in User.__table__.c and field != 'id'
+    }
+    if not values:
+        query = select(User).where(User.id == user_id)
+        if scope is not None:
+            query = query.where(scope)
+        result = await db.execute(query)
+        return result.scalar_one_or_none()
 
-    db.add(user)
-    await db.commit()
-    await db.refresh(user)
+    # Обновление
+    user = await _update_fields(db, user_id, values, scope)
+    if user:
+        evict_principal(user_id)
     return user
 
 
@@ -84,18 +144,25 @@ async def authenticate(
     user = await get(db, email=email)
     if not user:
         return None
-    if not security.verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not verified:
         return None
+
+    # Хэш устаревшей схемы или стоимости заменяется прозрачно
+    if new_hash:
+        user = await _update_fields(db, user.id, {'hashed_password': new_hash})
     return user
 
 
-async def soft_delete(db: AsyncSession, *, user_id: int) -> User:
-    user = await get(db, user_id=user_id)
+async def soft_delete(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    scope: Optional[ColumnElement[bool]] = None
+) -> Optional[User]:
+    user = await _update_fields(db, user_id, {'is_active': False}, scope)
     if user:
-        user.is_active = False
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
+        evict_principal(user_id)
     return user
 
 
@@ -108,3 +175,17 @@ async def get_all(db, skip: int = 0, limit: Optional[int] = None) -> List[User]:
 
     result = await db.execute(query)
     return result.scalars().all()
+
+
+async def get_principals(db: AsyncSession, user_ids: Iterable[int]) -> Dict[int, tuple]:
+    """Роль и активность пользователей одним запросом: id -> (role_id, role_code, is_active)"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+
+    result = await db.execute(
+        select(User.id, User.role_id, Role.code, User.is_active)
+        .join(Role, Role.id == User.role_id)
+        .where(User.id.in_(user_ids))
+    )
+    return {row.id: (row.role_id, row.code, row.is_active) for row in result}
@@ -1 +1 @@
-from .auth import get_current_user
+from .auth import get_current_principal, get_current_user
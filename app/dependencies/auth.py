@@ -1,3 +1,5 @@
+from typing import Any, Dict
+
 import jwt
 
 from fastapi import Depends
@@ -6,39 +8,77 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app import crud
 from app.models import User
+from app.core.security import decode_token as decode_jwt
 from app.core.config import settings
 from app.core.database import get_db
 from app.core.exceptions import UnauthorizedException
+from app.core.principal import Principal, get_principal
+from app.core.revocation import revocation_list
 
 
 security = HTTPBearer()
 
 
+def decode_token(token: str) -> Dict[str, Any]:
+    """Проверка подписи и срока действия токена"""
+    try:
+        payload = decode_jwt(token)
+    except jwt.ExpiredSignatureError:
+        raise UnauthorizedException(detail='Токен устарел')
+    except jwt.InvalidTokenError:
+        raise UnauthorizedException(detail='Недействительный токен')
+
+    if payload.get("sub") is None:
+        raise UnauthorizedException(detail='Недействительный токен')
+
+    return payload
+
+
+async def check_revoked(db: AsyncSession, payload: Dict[str, Any]) -> None:
+    """Проверка отзыва токена по списку в памяти"""
+    await revocation_list.sync(db)
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise UnauthorizedException(detail='Токен отозван')
+
+
+async def load_user(db: AsyncSession, payload: Dict[str, Any]) -> User:
+    user = await crud.user.get(db, user_id=int(payload["sub"]))
+    if not user:
+        raise UnauthorizedException(detail='Пользователь не найден')
+    return user
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
 ) -> User:
     """Dependency для получения текущего пользователя по JWT токену"""
-    token = credentials.credentials
+    payload = decode_token(credentials.credentials)
+    await check_revoked(db, payload)
+    return await load_user(db, payload)
 
-    try:
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
 
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise UnauthorizedException(detail='Недействительный токен')
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Dependency для получения текущего пользователя без запроса к БД
 
-        user = await crud.user.get(db, user_id=int(user_id))
-        if not user:
-            raise UnauthorizedException(detail='Пользователь не найден')
+    Пользователь берется из подписанных claims токена. Для токенов без
+    claims или при AUTH_STATELESS_PRINCIPAL=false загружается из БД
+    через кэш пользователей.
+    """
+    payload = decode_token(credentials.credentials)
+    await check_revoked(db, payload)
 
-        return user
+    if settings.AUTH_STATELESS_PRINCIPAL:
+        principal = Principal.from_claims(payload)
+        if principal is not None:
+            return principal
 
-    except jwt.ExpiredSignatureError:
-        raise UnauthorizedException(detail='Токен устарел')
-    except jwt.InvalidTokenError:
-        raise UnauthorizedException(detail='Недействительный токен')
+    principal = await get_principal(db, int(payload["sub"]))
+    if principal is None:
+        raise UnauthorizedException(detail='Пользователь не найден')
+    if not principal.is_active:
+        raise UnauthorizedException(detail='Пользователь удален')
+    return principal
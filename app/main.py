@@ -1,12 +1,19 @@
 from contextlib import asynccontextmanager
+import asyncio
+
 from fastapi import FastAPI
 
-from app.api import auth, user, order, product, permission
+from app.api import auth, jwks, user, order, product, permission, system
+from app.core import security
+from app.core.config import settings
+from app.core.read_your_writes import ReadYourWritesMiddleware
 from app.temp_db_init import init_tables
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if settings.PASSWORD_HASH_TARGET_MS > 0:
+        await asyncio.to_thread(security.calibrate_password_hashing, settings.PASSWORD_HASH_TARGET_MS)
     await init_tables()
     yield
 
@@ -21,11 +28,17 @@ app = FastAPI(
 )
 
 
+# Время последней записи клиента нужно только при чтении с реплики
+if settings.DB_REPLICA_URL:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 app.include_router(auth.router)
+app.include_router(jwks.router)
 app.include_router(user.router)
 app.include_router(product.router)
 app.include_router(order.router)
 app.include_router(permission.router)
+app.include_router(system.router)
 
 
 @app.get("/")
@@ -1,3 +1,4 @@
 from .user import User
-from .permission import Permission, Role, Resource, RolePermissionResource
+from .permission import Permission, Role, Resource, RolePermissionResource, PolicyVersion, new_policy_epoch
 from .resource import Product, Order
+from .token import RevokedToken
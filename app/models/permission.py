@@ -1,6 +1,7 @@
 from typing import List, Optional, Dict, Any
+import uuid
 
-from sqlalchemy import ForeignKey, String, JSON, Text, UniqueConstraint
+from sqlalchemy import ForeignKey, Integer, String, JSON, Text, UniqueConstraint, event
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.database import Base
@@ -16,7 +17,8 @@ class RolePermissionResource(Base):
     resource_id: Mapped[Optional[int]] = mapped_column(ForeignKey("resources.id"), nullable=True)
 
     # Условия доступа (например, фильтрация по определенным полям)
-    # Пример: {"min_price": 100, "status": ["active", "pending"]}
+    # Пример для заказов: {"status": ["pending", "completed"], "owner_id": {"not_in": [1]}}
+    # Поля - колонки модели ресурса, формат и операторы описаны в app/core/conditions.py
     conditions: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, default=None)
 
     # Relationships
@@ -70,3 +72,24 @@ class Resource(Base):
         back_populates="resource",
         cascade="all, delete-orphan"
     )
+
+
+def new_policy_epoch() -> str:
+    return uuid.uuid4().hex
+
+
+# Поколение политики доступа, увеличивается при каждом изменении правил.
+# Эпоха выдается при создании строки и отличает пересозданную БД
+class PolicyVersion(Base):
+    __tablename__ = "policy_version"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+    epoch: Mapped[str] = mapped_column(String, default=new_policy_epoch)
+
+
+@event.listens_for(PolicyVersion.__table__, "after_create")
+def _create_policy_version_row(target, connection, **kw):
+    # Единственная строка создается вместе с таблицей, писатели правил
+    # только увеличивают ее и не вставляют одновременно
+    connection.execute(target.insert().values(id=1, version=0, epoch=new_policy_epoch()))
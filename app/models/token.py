@@ -0,0 +1,14 @@
+from sqlalchemy import Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.core.database import Base
+
+
+class RevokedToken(Base):
+    """Отозванный токен, хранится до истечения срока его действия"""
+    __tablename__ = "revoked_tokens"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    jti: Mapped[str] = mapped_column(String, unique=True, index=True)
+    # Время истечения токена (unix timestamp)
+    expires_at: Mapped[int] = mapped_column(Integer, index=True)
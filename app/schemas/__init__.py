@@ -1,3 +1,3 @@
 from .user import UserCreate, UserUpdate, UserLogin, UserResponse
-from .token import AccessToken
+from .token import AccessToken, IntrospectRequest, IntrospectResponse, TokenInfo
 from .permission import RuleResponse, RuleCreate, RuleUpdate
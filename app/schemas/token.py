@@ -1,6 +1,27 @@
-from pydantic import BaseModel
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
 
 
 class AccessToken(BaseModel):
     access_token: str
     token_type: str = 'bearer'
+
+
+class IntrospectRequest(BaseModel):
+    tokens: List[str] = Field(min_length=1, max_length=settings.INTROSPECT_MAX_TOKENS)
+
+
+class TokenInfo(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    role_id: Optional[int] = None
+    role: Optional[str] = None
+    exp: Optional[int] = None
+    jti: Optional[str] = None
+
+
+class IntrospectResponse(BaseModel):
+    tokens: List[TokenInfo]
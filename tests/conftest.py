@@ -10,7 +10,12 @@ from sqlalchemy.orm import sessionmaker
 
 from app.main import app
 from app.core import security
-from app.core.database import Base, get_db
+from app.core.admission import auth_admission, introspect_admission
+from app.core.database import Base, get_db, get_read_db
+from app.core.permissions import decision_cache
+from app.core.policy import policy_engine
+from app.core.principal import principal_cache, principal_evictions
+from app.core.revocation import revocation_list
 from app.models import Resource, User, Order, Product, Permission, Role, RolePermissionResource
 
 
@@ -30,7 +35,7 @@ test_engine = create_async_engine(
 TestAsyncSessionLocal = sessionmaker(
     test_engine,
     class_=AsyncSession,
-    # expire_on_commit=False
+    expire_on_commit=False
 )
 
 
@@ -45,6 +50,7 @@ async def override_get_db() -> AsyncGenerator[AsyncSession, None]:
 
 # Монтируем зависимость
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 
 # Создаем TestClient
 client = TestClient(app)
@@ -109,6 +115,16 @@ async def setup_database():
     async with TestAsyncSessionLocal() as session:
         await init_test_data(session)
 
+    # Политика в памяти должна соответствовать новой БД
+    policy_engine.reset()
+    decision_cache.clear()
+    principal_cache.clear()
+    principal_evictions.reset()
+    auth_admission.reset()
+    introspect_admission.reset()
+    revocation_list.reset()
+    security.token_cache.clear()
+
     yield
 
     # Очистка после теста
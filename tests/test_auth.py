@@ -4,6 +4,7 @@ import time
 from fastapi import status
 
 from tests.conftest import client
+from tests.conftest import db_session as db
 
 
 class TestAuthentication:
@@ -159,3 +160,673 @@ class TestTokenValidation:
 
         # Проверяем, что токен не истек
         assert payload["exp"] > time.time()
+
+    @pytest.mark.anyio
+    async def test_token_contains_principal_claims(self, user_token):
+        """Токен содержит роль и признак активности"""
+        from app.core.config import settings
+
+        payload = jwt.decode(
+            user_token,
+            settings.JWT_SECRET,
+            algorithms=[settings.JWT_ALGORITHM]
+        )
+
+        assert payload["sub"] == "3"
+        assert payload["role_id"] == 3
+        assert payload["active"] is True
+        assert "pv" not in payload
+
+    @pytest.mark.anyio
+    async def test_principal_without_user_query(self, user_token):
+        """Пользователь берется из claims без запроса к таблице users"""
+        from sqlalchemy import event
+        from tests.conftest import test_engine
+
+        headers = {"Authorization": f"Bearer {user_token}"}
+        # Политика загружается первым запросом
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+        try:
+            response = client.get("/api/order/", headers=headers)
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 2
+        assert not any("FROM users" in statement for statement in statements)
+
+    @pytest.mark.anyio
+    async def test_token_without_claims_uses_database(self):
+        """Токен без claims пользователя проверяется по БД"""
+        from app.core.config import settings
+
+        token = jwt.encode(
+            {"sub": "3", "type": "access", "exp": int(time.time()) + 60},
+            settings.JWT_SECRET,
+            algorithm=settings.JWT_ALGORITHM
+        )
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 2
+
+        token = jwt.encode(
+            {"sub": "999", "type": "access", "exp": int(time.time()) + 60},
+            settings.JWT_SECRET,
+            algorithm=settings.JWT_ALGORITHM
+        )
+        headers = {"Authorization": f"Bearer {token}"}
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestPrincipalCache:
+    """Тесты кэша пользователей при проверке токенов по БД"""
+
+    @pytest.fixture(autouse=True)
+    def database_principal(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "AUTH_STATELESS_PRINCIPAL", False)
+
+    @pytest.mark.anyio
+    async def test_cached_principal_skips_query(self, user_token):
+        """Повторный запрос берет пользователя из кэша"""
+        from sqlalchemy import event
+        from tests.conftest import test_engine
+
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+        try:
+            response = client.get("/api/order/", headers=headers)
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not any("FROM users" in statement for statement in statements)
+
+    @pytest.mark.anyio
+    async def test_soft_delete_evicts_principal(self, admin_token, user_token):
+        """Удаленный пользователь сразу теряет доступ"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.delete("/api/user/3", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.anyio
+    async def test_eviction_reaches_other_workers(self, tmp_path, monkeypatch):
+        """Изменение пользователя в одном воркере сбрасывает только его запись в другом"""
+        from sqlalchemy import update
+        from app.core import principal as principal_module
+        from app.core.stamps import FileStamps
+        from app.models import User
+        from tests.conftest import TestAsyncSessionLocal
+
+        path = str(tmp_path / "principals")
+        monkeypatch.setattr(principal_module, "principal_evictions", FileStamps(path))
+        writer = FileStamps(path)
+
+        async with TestAsyncSessionLocal() as db:
+            await principal_module.get_principal(db, 2)
+            await principal_module.get_principal(db, 3)
+            cached = principal_module.principal_cache.get(2)
+
+            # Другой воркер удаляет пользователя 3 и отмечает это
+            await db.execute(update(User).where(User.id == 3).values(is_active=False))
+            await db.commit()
+            writer.touch(3)
+
+            principal = await principal_module.get_principal(db, 3)
+            assert not principal.is_active
+            # Запись другого пользователя не тронута
+            assert principal_module.principal_cache.get(2) is cached
+
+    @pytest.mark.anyio
+    async def test_eviction_during_load(self):
+        """Изменение во время загрузки не оставляет в кэше прежнюю запись"""
+        from sqlalchemy import event
+        from app.core.principal import evict_principal, get_principal
+        from tests.conftest import TestAsyncSessionLocal, test_engine
+
+        loads = []
+
+        def evict_during_load(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                loads.append(statement)
+                if len(loads) == 1:
+                    evict_principal(3)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", evict_during_load)
+        try:
+            async with TestAsyncSessionLocal() as db:
+                await get_principal(db, 3)
+                await get_principal(db, 3)
+                await get_principal(db, 3)
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", evict_during_load)
+
+        # Запись первой загрузки устарела, вторая загрузка попадает в кэш
+        assert len(loads) == 2
+
+    @pytest.mark.anyio
+    async def test_concurrent_loads_coalesced(self):
+        """Одновременные промахи кэша выполняют один запрос"""
+        import asyncio
+        from sqlalchemy import event
+        from app.core.principal import get_principal
+        from tests.conftest import TestAsyncSessionLocal, test_engine
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+        try:
+            async with TestAsyncSessionLocal() as db:
+                principals = await asyncio.gather(*(get_principal(db, 3) for _ in range(10)))
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+        assert len(statements) == 1
+        assert {(p.id, p.role_id, p.is_active) for p in principals} == {(3, 3, True)}
+        assert len({id(p) for p in principals}) == 10
+
+
+class TestPasswordHasher:
+    """Тесты пула хэширования паролей"""
+
+    @pytest.mark.anyio
+    async def test_hash_and_verify(self):
+        """Хэш и проверка выполняются вне event loop"""
+        from app.core.hashing import PasswordHasher
+
+        hasher = PasswordHasher(max_workers=2, max_queue=2)
+        hashed = await hasher.hash("secret")
+        assert await hasher.verify("secret", hashed)
+        assert not await hasher.verify("wrong", hashed)
+
+        stats = hasher.stats()
+        assert stats["hashes"] == 3
+        assert stats["in_flight"] == 0
+        assert stats["queue_depth"] == 0
+        assert stats["max_ms"] > 0
+
+    @pytest.mark.anyio
+    async def test_bounded_queue(self):
+        """При заполненной очереди задачи сразу отклоняются"""
+        import asyncio
+        import threading
+        from app.core.hashing import HashingOverloaded, PasswordHasher
+
+        hasher = PasswordHasher(max_workers=1, max_queue=1)
+        release = threading.Event()
+
+        running = [
+            asyncio.ensure_future(hasher._submit(release.wait)),
+            asyncio.ensure_future(hasher._submit(release.wait)),
+        ]
+        await asyncio.sleep(0.05)
+        assert hasher.in_flight == 2
+        assert hasher.queue_depth == 1
+
+        with pytest.raises(HashingOverloaded):
+            await hasher.hash("secret")
+        assert hasher.stats()["rejected"] == 1
+
+        release.set()
+        await asyncio.gather(*running)
+        assert hasher.in_flight == 0
+
+    @pytest.mark.anyio
+    async def test_login_overloaded(self, monkeypatch):
+        """Перегрузка пула хэширования возвращает 503 с Retry-After"""
+        from app.core.hashing import password_hasher
+
+        monkeypatch.setattr(password_hasher, "max_workers", 0)
+        monkeypatch.setattr(password_hasher, "max_queue", 0)
+
+        response = client.post(
+            "/api/auth/login", json={"email": "user@example.com", "password": "123"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert "Retry-After" in response.headers
+
+
+class TestAdmissionControl:
+    """Тесты допуска к login и register"""
+
+    @pytest.mark.anyio
+    async def test_token_bucket(self):
+        """Ведро отдает burst токенов, затем сообщает время ожидания"""
+        from app.core.admission import TokenBucket
+
+        bucket = TokenBucket(rate_per_minute=60, burst=2, maxsize=10)
+        assert bucket.acquire("a") == 0
+        assert bucket.acquire("a") == 0
+        assert 0 < bucket.acquire("a") <= 1
+        # Ключи независимы
+        assert bucket.acquire("b") == 0
+
+        assert TokenBucket(rate_per_minute=0, burst=0, maxsize=10).acquire("a") == 0
+
+    @pytest.mark.anyio
+    async def test_email_rate_limit(self):
+        """Превышение лимита попыток для email возвращает 429"""
+        from app.core.config import settings
+
+        login_data = {"email": "user@example.com", "password": "wrong"}
+        for _ in range(settings.AUTH_EMAIL_BURST):
+            response = client.post("/api/auth/login", json=login_data)
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = client.post("/api/auth/login", json=login_data)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response.headers["Retry-After"]) >= 1
+
+        # Другой email не ограничен
+        response = client.post(
+            "/api/auth/login", json={"email": "admin@example.com", "password": "123"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.anyio
+    async def test_in_flight_limit(self, monkeypatch):
+        """При занятой мощности хэширования запрос сразу получает 503"""
+        from app.core.admission import auth_admission
+
+        monkeypatch.setattr(auth_admission, "in_flight", auth_admission.max_in_flight)
+
+        response = client.post(
+            "/api/auth/login", json={"email": "user@example.com", "password": "123"}
+        )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert "Retry-After" in response.headers
+
+
+class TestPasswordSchemes:
+    """Тесты схем хэширования паролей"""
+
+    @pytest.mark.anyio
+    async def test_outdated_hash_upgraded_on_login(self, monkeypatch, db):
+        """Хэш устаревшей схемы заменяется при успешном входе"""
+        from sqlalchemy import select
+        from app.core import security
+        from app.models import User
+
+        monkeypatch.setattr(
+            security, "pwd_context", security.create_password_context(["scrypt", "bcrypt"], rounds=4)
+        )
+
+        login_data = {"email": "user@example.com", "password": "123"}
+        response = client.post("/api/auth/login", json=login_data)
+        assert response.status_code == status.HTTP_200_OK
+
+        result = await db.execute(select(User.hashed_password).where(User.id == 3))
+        assert result.scalar_one().startswith("$scrypt$")
+
+        # Новый хэш подходит для следующего входа
+        response = client.post("/api/auth/login", json=login_data)
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.anyio
+    async def test_scheme_without_backend_rejected(self, monkeypatch):
+        """Схема без установленной библиотеки отклоняется при создании контекста"""
+        from passlib.registry import get_crypt_handler
+        from app.core import security
+
+        handler = get_crypt_handler("argon2")
+        monkeypatch.setattr(handler, "has_backend", lambda name="any": False)
+
+        with pytest.raises(RuntimeError, match="argon2"):
+            security.create_password_context(["argon2", "bcrypt"])
+        with pytest.raises(RuntimeError, match="argon2"):
+            security.create_password_context(["bcrypt", "argon2"])
+
+    @pytest.mark.anyio
+    async def test_calibration(self, monkeypatch):
+        """Подбор стоимости не превышает целевое время"""
+        from app.core import security
+
+        monkeypatch.setattr(security, "pwd_context", security.pwd_context)
+
+        rounds = security.calibrate_password_hashing(target_ms=1)
+        assert 4 <= rounds <= 6
+        assert security.pwd_context.hash("secret").startswith(f"$2b$0{rounds}$")
+        assert not security.pwd_context.needs_update(security.get_password_hash("secret"))
+
+
+class TestTokenRevocation:
+    """Тесты отзыва токенов"""
+
+    @pytest.mark.anyio
+    async def test_logout_revokes_token(self, user_token, manager_token):
+        """После выхода токен больше не принимается"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.post("/api/auth/logout", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response.json()["detail"] == "Токен отозван"
+
+        # Другие токены не затронуты
+        headers = {"Authorization": f"Bearer {manager_token}"}
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.anyio
+    async def test_revocation_synced_from_database(self, user_token):
+        """Отзыв из другого процесса подтягивается из БД"""
+        from app.core.revocation import revocation_list
+
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.post("/api/auth/logout", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        # Память процесса пуста, как у другого воркера
+        revocation_list.reset()
+        response = client.get("/api/order/", headers=headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.anyio
+    async def test_expired_entries_removed(self):
+        """Записи удаляются после истечения срока токена"""
+        from app.core.revocation import RevocationList
+
+        revoked = RevocationList(capacity=4, error_rate=0.01, sync_interval=60)
+        now = int(time.time())
+        revoked.add("active", now + 60)
+        revoked.add("expired", now - 1)
+        for i in range(10):
+            revoked.add(f"jti-{i}", now + 60)
+
+        assert revoked.is_revoked("active")
+        assert revoked.is_revoked("jti-9")
+        assert not revoked.is_revoked("expired")
+        assert not revoked.is_revoked("unknown")
+        assert not revoked.is_revoked(None)
+
+        revoked.add("expired-later", now - 1)
+        revoked.purge()
+        assert len(revoked._revoked) == 11
+
+
+def write_private_key(path, algorithm):
+    """PEM закрытого ключа для алгоритма"""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        key = ed25519.Ed25519PrivateKey.generate()
+
+    path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    ))
+
+
+class TestAsymmetricKeys:
+    """Тесты асимметричной подписи токенов"""
+
+    @pytest.fixture(autouse=True)
+    def require_crypto(self):
+        pytest.importorskip("cryptography")
+
+    @pytest.mark.anyio
+    @pytest.mark.parametrize("algorithm", ["RS256", "ES256", "EdDSA"])
+    async def test_sign_and_verify_with_jwks(self, tmp_path, algorithm):
+        """Токен проверяется по открытому ключу из JWKS"""
+        from app.core.keys import KeyRing
+
+        write_private_key(tmp_path / "k1.pem", algorithm)
+        ring = KeyRing(algorithm, keys_dir=str(tmp_path))
+
+        token = ring.encode({"sub": "1"})
+        assert jwt.get_unverified_header(token)["kid"] == "k1"
+        assert ring.decode(token)["sub"] == "1"
+
+        # Проверка на стороне другого сервиса
+        (jwk,) = ring.jwks()["keys"]
+        assert jwk["kid"] == "k1" and jwk["alg"] == algorithm
+        payload = jwt.decode(token, jwt.PyJWK(jwk).key, algorithms=[algorithm])
+        assert payload["sub"] == "1"
+
+    @pytest.mark.anyio
+    async def test_rotation(self, tmp_path):
+        """Новый ключ подписывает токены, старые токены остаются валидными"""
+        import os
+        from app.core.keys import KeyRing
+
+        write_private_key(tmp_path / "k1.pem", "ES256")
+        ring = KeyRing("ES256", keys_dir=str(tmp_path), reload_interval=0)
+        rotations = []
+        ring.on_rotate(lambda: rotations.append(ring.generation))
+
+        old_token = ring.encode({"sub": "1"})
+
+        write_private_key(tmp_path / "k2.pem", "ES256")
+        stat = os.stat(tmp_path / "k1.pem")
+        os.utime(tmp_path / "k2.pem", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))
+
+        new_token = ring.encode({"sub": "2"})
+        assert jwt.get_unverified_header(new_token)["kid"] == "k2"
+        assert rotations == [2]
+        assert ring.decode(old_token)["sub"] == "1"
+        assert ring.decode(new_token)["sub"] == "2"
+
+        # Неизвестный kid отклоняется
+        token = jwt.encode(
+            {"sub": "3"}, ring._keys["k1"].private_key, algorithm="ES256",
+            headers={"kid": "unknown"}
+        )
+        with pytest.raises(jwt.InvalidTokenError):
+            ring.decode(token)
+
+    @pytest.mark.anyio
+    async def test_api_with_asymmetric_keys(self, tmp_path, monkeypatch):
+        """Вход, проверка токена и JWKS эндпоинт с ключами EdDSA"""
+        from app.api import jwks
+        from app.core import keys, security
+        from app.core.keys import KeyRing
+
+        write_private_key(tmp_path / "main.pem", "EdDSA")
+        ring = KeyRing("EdDSA", keys_dir=str(tmp_path))
+        monkeypatch.setattr(keys, "key_ring", ring)
+        monkeypatch.setattr(security, "key_ring", ring)
+        monkeypatch.setattr(jwks, "key_ring", ring)
+
+        response = client.post(
+            "/api/auth/login", json={"email": "user@example.com", "password": "123"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        token = response.json()["access_token"]
+        assert jwt.get_unverified_header(token)["alg"] == "EdDSA"
+
+        response = client.get("/api/order/", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/.well-known/jwks.json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["keys"][0]["kid"] == "main"
+        assert "max-age" in response.headers["Cache-Control"]
+
+        response = client.get(
+            "/.well-known/jwks.json", headers={"If-None-Match": response.headers["ETag"]}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+class TestTokenCache:
+    """Тесты кэша проверенных токенов"""
+
+    @pytest.mark.anyio
+    async def test_verified_token_memoized(self, monkeypatch):
+        """Повторная проверка токена не проверяет подпись"""
+        from app.core import security
+
+        token = security.key_ring.encode({"sub": "1", "exp": int(time.time()) + 60})
+        calls = []
+        decode = security.key_ring.decode
+        monkeypatch.setattr(security.key_ring, "decode", lambda t: calls.append(t) or decode(t))
+
+        assert security.decode_token(token)["sub"] == "1"
+        payload = security.decode_token(token)
+        assert payload["sub"] == "1"
+        assert len(calls) == 1
+
+        # Изменение результата не портит кэш
+        payload["sub"] = "2"
+        assert security.decode_token(token)["sub"] == "1"
+
+    @pytest.mark.anyio
+    async def test_expired_token_not_served(self):
+        """Запись кэша живет только до exp токена"""
+        from app.core import security
+
+        token = security.key_ring.encode({"sub": "1", "exp": int(time.time()) + 1})
+        assert security.decode_token(token)["sub"] == "1"
+
+        time.sleep(1.1)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            security.decode_token(token)
+
+    @pytest.mark.anyio
+    async def test_cleared_on_rotation(self, tmp_path):
+        """Смена ключей очищает кэш"""
+        pytest.importorskip("cryptography")
+        from app.core.cache import TTLCache
+        from app.core.keys import KeyRing
+
+        write_private_key(tmp_path / "k1.pem", "ES256")
+        ring = KeyRing("ES256", keys_dir=str(tmp_path))
+        cache = TTLCache(10, ttl=60)
+        ring.on_rotate(cache.clear)
+        cache.set("token", {"sub": "1"})
+
+        write_private_key(tmp_path / "k2.pem", "ES256")
+        ring.reload()
+        assert len(cache) == 0
+
+
+class TestIntrospection:
+    """Тесты пакетной проверки токенов"""
+
+    gateway_headers = {"X-Gateway-Key": "gateway-test-key"}
+
+    @pytest.fixture(autouse=True)
+    def gateway_keys(self, monkeypatch):
+        from app.core.config import settings
+        monkeypatch.setattr(settings, "INTROSPECT_GATEWAY_KEYS", ["other-key", "gateway-test-key"])
+
+    @pytest.mark.anyio
+    async def test_introspect_batch(self, admin_token, user_token, guest_token):
+        """Каждый токен получает свой статус, пользователи загружаются одним запросом"""
+        from sqlalchemy import event
+        from tests.conftest import test_engine
+
+        response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {guest_token}"})
+        assert response.status_code == status.HTTP_200_OK
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+        try:
+            response = client.post(
+                "/api/auth/introspect",
+                json={"tokens": [admin_token, user_token, guest_token, "not-a-token"]},
+                headers=self.gateway_headers
+            )
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+        assert response.status_code == status.HTTP_200_OK
+        admin, user, guest, invalid = response.json()["tokens"]
+        assert admin["active"] and admin["sub"] == "1" and admin["role"] == "admin"
+        assert user["active"] and user["role_id"] == 3 and user["role"] == "user"
+        assert not guest["active"]
+        assert invalid == {"active": False, "sub": None, "role_id": None, "role": None, "exp": None, "jti": None}
+        assert len(statements) == 1
+
+    @pytest.mark.anyio
+    async def test_introspect_limit(self, user_token):
+        """Число токенов в запросе ограничено"""
+        from app.core.config import settings
+
+        tokens = [user_token] * (settings.INTROSPECT_MAX_TOKENS + 1)
+        response = client.post("/api/auth/introspect", json={"tokens": tokens}, headers=self.gateway_headers)
+        assert response.status_code == 422
+
+    @pytest.mark.anyio
+    async def test_introspect_requires_gateway_key(self, user_token):
+        """Без ключа шлюза токены не проверяются"""
+        from app.core.config import settings
+
+        data = {"tokens": [user_token]}
+        response = client.post("/api/auth/introspect", json=data)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = client.post("/api/auth/introspect", json=data, headers={"X-Gateway-Key": "wrong"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # Токен пользователя не заменяет ключ шлюза
+        response = client.post("/api/auth/introspect", json=data, headers={"Authorization": f"Bearer {user_token}"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        settings.INTROSPECT_GATEWAY_KEYS = []
+        response = client.post("/api/auth/introspect", json=data, headers=self.gateway_headers)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.anyio
+    async def test_introspect_admission(self, monkeypatch, user_token):
+        """Запросы сверх лимита отклоняются до проверки токенов"""
+        from app.core.admission import TokenBucket, introspect_admission
+
+        monkeypatch.setattr(introspect_admission, "ip_bucket", TokenBucket(rate_per_minute=60, burst=2, maxsize=10))
+        data = {"tokens": [user_token]}
+        for _ in range(2):
+            response = client.post("/api/auth/introspect", json=data, headers={"X-Gateway-Key": "wrong"})
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        response = client.post("/api/auth/introspect", json=data, headers=self.gateway_headers)
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        monkeypatch.setattr(introspect_admission, "in_flight", introspect_admission.max_in_flight)
+        introspect_admission.ip_bucket.reset()
+        response = client.post("/api/auth/introspect", json=data, headers=self.gateway_headers)
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
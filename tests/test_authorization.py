@@ -241,3 +241,124 @@ class TestPermissionScope:
 
         # Менеджер должен видеть все заказы
         assert len(orders) == 4  # Все заказы в системе
+
+
+class TestScopedMutations:
+    """Тесты изменений с проверкой прав в WHERE запроса"""
+
+    @pytest.mark.anyio
+    async def test_user_updates_only_own_orders(self, user_token, manager_token):
+        """Свой заказ обновляется, чужой - 403, несуществующий - 404"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+
+        response = client.put("/api/order/1", json={"status": "completed"}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["status"] == "completed"
+
+        response = client.put("/api/order/4", json={"status": "completed"}, headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        response = client.put("/api/order/999", json={"status": "completed"}, headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        # Чужой заказ не изменился
+        headers = {"Authorization": f"Bearer {manager_token}"}
+        response = client.get("/api/order/4", headers=headers)
+        assert response.json()["status"] == "pending"
+
+    @pytest.mark.anyio
+    async def test_delete_order(self, admin_token, user_token):
+        """Удаление без прав - 403, повторное удаление - 404"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+        response = client.delete("/api/order/1", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.delete("/api/order/1", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.delete("/api/order/1", headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    @pytest.mark.anyio
+    async def test_conditions_in_where(self, db_session, guest_token):
+        """Условия правила проверяются тем же UPDATE"""
+        from app import crud, schemas
+
+        await crud.permission.create_rule(
+            db_session,
+            rule_data=schemas.RuleCreate(
+                role_id=4, permission_id=4, resource_id=2,
+                conditions={"status": ["pending"]}
+            )
+        )
+
+        headers = {"Authorization": f"Bearer {guest_token}"}
+        response = client.put("/api/order/1", json={"status": "pending"}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.put("/api/order/2", json={"status": "pending"}, headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    @pytest.mark.anyio
+    async def test_unbound_own_rule_matches_object_check(self, db_session, guest_token):
+        """Правило own без привязки к ресурсу одинаково действует на чтение, изменение и удаление"""
+        from app import crud, schemas
+        from app.models import Order
+
+        # Чтение, изменение и удаление своих для всех ресурсов
+        for permission_id in (2, 5, 7):
+            await crud.permission.create_rule(
+                db_session,
+                rule_data=schemas.RuleCreate(role_id=4, permission_id=permission_id, resource_id=None)
+            )
+        order = Order(owner_id=4, status="pending")
+        db_session.add(order)
+        await db_session.commit()
+
+        headers = {"Authorization": f"Bearer {guest_token}"}
+        for order_id, allowed in ((order.id, True), (1, False)):
+            expected = status.HTTP_200_OK if allowed else status.HTTP_403_FORBIDDEN
+            response = client.get(f"/api/order/{order_id}", headers=headers)
+            assert response.status_code == expected
+            response = client.put(f"/api/order/{order_id}", json={"status": "completed"}, headers=headers)
+            assert response.status_code == expected
+            response = client.delete(f"/api/order/{order_id}", headers=headers)
+            assert response.status_code == expected
+
+    @pytest.mark.anyio
+    async def test_user_soft_delete_scope(self, user_token):
+        """Пользователь может удалить только себя"""
+        headers = {"Authorization": f"Bearer {user_token}"}
+
+        response = client.delete("/api/user/2", headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        response = client.put("/api/user/3", json={"id": 3, "first_name": "Новое"}, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["first_name"] == "Новое"
+
+        response = client.delete("/api/user/3", headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.anyio
+    async def test_password_not_hashed_without_access(self, admin_token, guest_token):
+        """Пароль не хэшируется, если изменение будет отклонено"""
+        from app.core.hashing import password_hasher
+
+        hashes = password_hasher.stats()["hashes"]
+        update = {"id": 1, "password": "new-password", "password_confirm": "new-password"}
+
+        headers = {"Authorization": f"Bearer {guest_token}"}
+        response = client.put("/api/user/1", json=update, headers=headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        response = client.put("/api/user/999", json=dict(update, id=999), headers=headers)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        assert password_hasher.stats()["hashes"] == hashes
+
+        response = client.put("/api/user/1", json=update, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert password_hasher.stats()["hashes"] == hashes + 1
@@ -1,10 +1,15 @@
+from types import SimpleNamespace
+import logging
+
 import pytest
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import event, select
 
 from app.models import User, Product, Order
-from app.core.permissions import PermissionChecker
-from tests.conftest import client, db_session as db
+from app.core.decision_log import DecisionLog
+from app.core.permissions import PermissionChecker, decision_cache
+from tests.benchmarks.bench_permissions import compare, parse_args, run
+from tests.conftest import client, db_session as db, test_engine
 
 
 class TestPermissionChecker:
@@ -98,6 +103,22 @@ class TestPermissionChecker:
         has_permission = await checker.check_permission()
         assert not has_permission
 
+    @pytest.mark.anyio
+    async def test_max_scope_from_access_bits(self, db: AsyncSession):
+        """Максимальный scope берется из битов доступа роли"""
+        from app.core.principal import Principal
+
+        cases = [
+            (1, "orders", "read", "all"),
+            (2, "orders", "read", "all"),
+            (3, "orders", "read", "own"),
+            (3, "users", "delete", "own"),
+            (4, "orders", "read", "none"),
+        ]
+        for role_id, resource, action, expected in cases:
+            checker = PermissionChecker(db, Principal(role_id, role_id), resource, action)
+            assert await checker.get_user_max_scope() == expected
+
     @pytest.mark.anyio
     async def test_apply_scope_filter(self, db: AsyncSession):
         """Тест применения фильтров scope к запросам"""
@@ -129,3 +150,148 @@ class TestPermissionChecker:
 
         # Менеджер должен видеть все заказы (scope=all)
         assert len(manager_orders) == 4  # В тестовых данных 4 заказа
+
+    @pytest.mark.anyio
+    async def test_policy_answers_from_memory(self, db: AsyncSession):
+        """После загрузки политики проверки не обращаются к БД"""
+        result = await db.execute(select(User).where(User.email == "user@example.com"))
+        user = result.scalar_one()
+        result = await db.execute(select(Order).where(Order.owner_id == user.id).limit(1))
+        own_order = result.scalar_one()
+
+        # Первая проверка загружает политику
+        checker = PermissionChecker(db, user, "orders", "read")
+        assert await checker.check_permission()
+
+        statements = []
+
+        def count_statements(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", count_statements)
+        try:
+            checker = PermissionChecker(db, user, "orders", "read", own_order)
+            assert await checker.check_permission()
+            assert await checker.get_user_max_scope() == "own"
+            await checker.apply_scope_filter(Order)
+
+            checker = PermissionChecker(db, user, "products", "create")
+            assert not await checker.check_permission()
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", count_statements)
+
+        assert statements == []
+
+    @pytest.mark.anyio
+    async def test_check_many(self, db: AsyncSession):
+        """Пакетная проверка совпадает с проверкой каждого объекта"""
+        result = await db.execute(select(User).where(User.email == "user@example.com"))
+        user = result.scalar_one()
+
+        result = await db.execute(select(Order).order_by(Order.id))
+        orders = result.scalars().all()
+
+        checker = PermissionChecker(db, user, "orders", "read")
+        mask = await checker.check_many(orders)
+
+        for order, allowed in zip(orders, mask):
+            single = PermissionChecker(db, user, "orders", "read", order)
+            assert allowed == await single.check_permission()
+            assert allowed == (order.owner_id == user.id)
+
+        own_orders = await checker.filter_many(orders)
+        assert [order.id for order in own_orders] == [o.id for o, a in zip(orders, mask) if a]
+
+        # Гость не имеет прав на заказы
+        result = await db.execute(select(User).where(User.email == "guest@example.com"))
+        guest = result.scalar_one()
+        checker = PermissionChecker(db, guest, "orders", "read")
+        assert await checker.filter_many(orders) == []
+
+    @pytest.mark.anyio
+    async def test_decision_cache(self, db: AsyncSession):
+        """Повторные решения берутся из кэша, объекты различаются по владельцу"""
+        result = await db.execute(select(User).where(User.email == "user@example.com"))
+        user = result.scalar_one()
+        result = await db.execute(select(Order).order_by(Order.id))
+        orders = result.scalars().all()
+
+        checker = PermissionChecker(db, user, "orders", "read")
+        assert await checker.check_permission()
+        hits = decision_cache.hits
+
+        checker = PermissionChecker(db, user, "orders", "read")
+        assert await checker.check_permission()
+        assert decision_cache.hits == hits + 1
+
+        # Результат для объектов не смешивается между своими и чужими
+        for _ in range(2):
+            for order in orders:
+                checker = PermissionChecker(db, user, "orders", "read", order)
+                assert await checker.check_permission() == (order.owner_id == user.id)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestDecisionLog:
+    """Тесты лога решений авторизации"""
+
+    @pytest.mark.anyio
+    async def test_sampling_keeps_denies(self):
+        """При нулевой доле сэмплирования пишутся только отказы"""
+        logger = logging.getLogger("tests.decision_log")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = ListHandler()
+        logger.addHandler(handler)
+
+        user = SimpleNamespace(id=3, role_id=3)
+        try:
+            log = DecisionLog(logger, sample_rate=0.0, deny_full_rate=True)
+            log.log(user, "orders", "read", True, "no_object")
+            log.log(user, "orders", "read", False, "object_denied")
+            assert len(handler.records) == 1
+            assert "decision=deny" in handler.records[0].getMessage()
+            assert "user_id=3" in handler.records[0].getMessage()
+
+            log = DecisionLog(logger, sample_rate=0.0, deny_full_rate=False)
+            log.log(user, "orders", "read", False, "object_denied")
+            assert len(handler.records) == 1
+
+            log = DecisionLog(logger, sample_rate=1.0)
+            log.log(user, "orders", "read", True, "no_object")
+            assert len(handler.records) == 2
+        finally:
+            logger.removeHandler(handler)
+
+
+class TestBenchmark:
+    """Проверка работоспособности бенчмарка авторизации"""
+
+    @pytest.mark.anyio
+    async def test_small_run_and_baseline(self, tmp_path):
+        """Короткий прогон и сравнение с базовой линией"""
+        args = parse_args([
+            "--db-url", f"sqlite+aiosqlite:///{tmp_path / 'bench.db'}",
+            "--roles", "5", "--resources", "3", "--rules", "50",
+            "--iterations", "50", "--warmup", "0", "--load-iterations", "1",
+        ])
+        report = await run(args)
+
+        assert set(report["results"]) == {
+            "policy_load", "check_permission", "check_permission_object",
+            "get_user_max_scope", "apply_scope_filter",
+        }
+        assert compare(report, report, 0.2) == []
+
+        slower = {"results": {"check_permission": {"p50_us": 0.001, "p99_us": 0.001}}}
+        regressions = compare(report, slower, 0.2)
+        assert len(regressions) == 2
+        assert regressions[0].startswith("check_permission.p50_us")
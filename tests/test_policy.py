@@ -0,0 +1,517 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import status
+
+from app.core.conditions import compile_conditions
+from app.core.policy import (
+    ACCESS_ALL, ACCESS_ANY, ACCESS_OWN,
+    FILTER_ALL, FILTER_DENY, FILTER_OWN, FILTER_RULES, CompiledPolicy, CompiledRule
+)
+from app.core.policy import PolicyEngine, policy_rows
+from app.core.policy_bus import FileBus, Generation, InProcessBus
+from app.core.policy_snapshot import PolicySnapshot
+from tests.conftest import db_session as db
+from tests.conftest import client
+
+
+class TestPolicyInvalidation:
+    """Тесты инвалидации политики доступа"""
+
+    @pytest.mark.anyio
+    async def test_rule_changes_apply_immediately(self, admin_token, guest_token):
+        """Изменение правил сразу влияет на проверки прав"""
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        guest_headers = {"Authorization": f"Bearer {guest_token}"}
+
+        # Гость не может читать заказы
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+        # Выдаем гостю чтение всех заказов
+        rule_data = {"role_id": 4, "permission_id": 1, "resource_id": 2}
+        response = client.post("/api/permission/rules", json=rule_data, headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+        rule_id = response.json()["id"]
+
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()) == 4
+
+        # Удаляем правило
+        response = client.delete(f"/api/permission/rules/{rule_id}", headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    @pytest.mark.anyio
+    async def test_changes_from_other_worker_seen_via_database(self, db):
+        """Изменение из воркера, до которого не доходит шина, видно по строке в БД"""
+        import asyncio
+        from app.crud.permission import bump_policy_version
+        from tests.conftest import TestAsyncSessionLocal
+
+        engine = PolicyEngine(InProcessBus(), version_poll_interval=0.05)
+        policy = await engine.get(db)
+
+        # Другой воркер меняет правила, шина этого воркера о них не знает
+        async with TestAsyncSessionLocal() as other:
+            generation = await bump_policy_version(other)
+            await other.commit()
+
+        assert await engine.get(db) is policy
+        await asyncio.sleep(0.06)
+        assert (await engine.get(db)).generation == generation
+
+    @pytest.mark.anyio
+    async def test_bump_without_version_row(self, db):
+        """Поколение увеличивается и при отсутствии строки policy_version"""
+        from sqlalchemy import delete
+        from app.core.policy import read_policy_version
+        from app.crud.permission import bump_policy_version
+        from app.models import PolicyVersion
+
+        assert (await read_policy_version(db)).epoch
+        await db.execute(delete(PolicyVersion))
+        await db.commit()
+
+        generation = await bump_policy_version(db)
+        await db.commit()
+        assert generation.version == 1 and generation.epoch
+        assert await read_policy_version(db) == generation
+
+
+class TestPolicyBits:
+    """Тесты битовых масок ролей"""
+
+    @pytest.mark.anyio
+    async def test_access_bits_match_rules(self):
+        """Биты доступа соответствуют правилам из индекса"""
+        specs = [
+            (1, None, "read", "all"),
+            (2, "orders", "read", "own"),
+            (2, "orders", "read", "all"),
+            (2, "orders", "update", "own"),
+            (2, None, "delete", "all"),
+            (3, "products", "read", "all"),
+        ]
+        rules = [
+            CompiledRule(
+                id=i, role_id=role_id, permission_id=i, resource_id=None if resource is None else i,
+                resource=resource, action=action, scope=scope, conditions=None,
+                predicate=compile_conditions(None),
+            )
+            for i, (role_id, resource, action, scope) in enumerate(specs, start=1)
+        ]
+        policy = CompiledPolicy(rules)
+
+        for role_id in (1, 2, 3, 4):
+            for resource in ("orders", "products", "users"):
+                for action in ("read", "update", "delete", "create"):
+                    matched = policy.get_rules(role_id, resource, action)
+                    expected = 0
+                    if matched:
+                        expected = ACCESS_ANY
+                        if any(r.scope == "all" for r in matched):
+                            expected |= ACCESS_ALL
+                        if any(r.scope == "own" for r in matched):
+                            expected |= ACCESS_OWN
+                    assert policy.access_bits(role_id, resource, action) == expected
+
+
+class TestScopeFilter:
+    """Тесты заранее вычисленной таблицы фильтров списка"""
+
+    @pytest.mark.anyio
+    async def test_scope_filter(self):
+        """Фильтр списка выбирается по таблице"""
+        specs = [
+            (1, None, "read", "all", None),
+            (2, "orders", "read", "own", None),
+            (2, "products", "read", "all", {"status": ["active"]}),
+            (2, "products", "read", "own", None),
+        ]
+        rules = [
+            CompiledRule(
+                id=i, role_id=role_id, permission_id=i, resource_id=None if resource is None else i,
+                resource=resource, action=action, scope=scope, conditions=conditions,
+                predicate=compile_conditions(conditions),
+            )
+            for i, (role_id, resource, action, scope, conditions) in enumerate(specs, start=1)
+        ]
+        policy = CompiledPolicy(rules, resources=["orders", "products", "users"])
+
+        assert policy.scope_filter(1, "users", "read") == FILTER_ALL
+        assert policy.scope_filter(1, "unknown", "read") == FILTER_ALL
+        assert policy.scope_filter(2, "orders", "read") == FILTER_OWN
+        assert policy.scope_filter(2, "products", "read") == FILTER_RULES
+        assert policy.scope_filter(2, "users", "read") == FILTER_DENY
+        assert policy.scope_filter(1, "users", "update") == FILTER_DENY
+
+
+class TestPolicySnapshot:
+    """Тесты общего снимка политики"""
+
+    @pytest.mark.anyio
+    async def test_snapshot_matches_database(self, db, tmp_path):
+        """Политика из снимка совпадает с политикой из БД"""
+        from app.core.policy import MappedPolicy, load_policy
+
+        snapshot = PolicySnapshot(str(tmp_path / "policy.bin"))
+        assert snapshot.generation() is None
+        policy = await load_policy(db)
+
+        # Первый воркер загружает политику из БД, пишет снимок и отвечает из него
+        writer = PolicyEngine(InProcessBus(), snapshot)
+        assert isinstance(await writer.get(db), MappedPolicy)
+        assert snapshot.generation() == policy.generation
+
+        # Второй воркер читает снимок
+        reader = PolicyEngine(InProcessBus(), PolicySnapshot(snapshot.path))
+        mapped = await reader.get(db)
+        assert isinstance(mapped, MappedPolicy)
+        assert sorted(policy_rows(mapped)) == sorted(policy_rows(policy))
+        assert mapped.resources == policy.resources
+        for role_id in (1, 2, 3, 4, 5):
+            for resource in ("users", "orders", "products", "unknown"):
+                for action in ("read", "create", "update", "delete", "unknown"):
+                    assert mapped.scope_filter(role_id, resource, action) == policy.scope_filter(role_id, resource, action)
+                    assert mapped.access_bits(role_id, resource, action) == policy.access_bits(role_id, resource, action)
+                    assert (
+                        sorted(rule.id for rule in mapped.get_rules(role_id, resource, action))
+                        == sorted(rule.id for rule in policy.get_rules(role_id, resource, action))
+                    )
+
+    @pytest.mark.anyio
+    async def test_snapshot_compiles_rules_on_first_use(self, tmp_path, monkeypatch):
+        """Правила из снимка компилируются только для запрошенных ключей"""
+        from app.core import policy as policy_module
+        from app.core.policy import MappedPolicy
+
+        rules = [
+            (i, role_id, 1, 2, {"status": ["pending"]}, "read", "all", "orders")
+            for i, role_id in enumerate(range(1, 101), start=1)
+        ]
+        snapshot = PolicySnapshot(str(tmp_path / "policy.bin"))
+        snapshot.write(Generation("a", 1), rules, ["orders"])
+
+        compiled = []
+        compile_rule_conditions = policy_module._compile_rule_conditions
+
+        def counting_compile(rule_id, conditions):
+            compiled.append(rule_id)
+            return compile_rule_conditions(rule_id, conditions)
+
+        monkeypatch.setattr(policy_module, "_compile_rule_conditions", counting_compile)
+
+        policy = MappedPolicy(snapshot.view())
+        assert policy.rules_count == 100
+        assert policy.access_bits(7, "orders", "read") == ACCESS_ANY | ACCESS_ALL
+        assert policy.scope_filter(7, "orders", "read") == FILTER_RULES
+        assert compiled == []
+
+        rule, = policy.get_rules(7, "orders", "read")
+        assert rule.predicate.check(SimpleNamespace(status="pending"))
+        assert policy.get_rules(7, "orders", "read") == (rule,)
+        assert compiled == [7]
+
+    @pytest.mark.anyio
+    async def test_snapshot_remap(self, tmp_path):
+        """Новый снимок виден без перезапуска"""
+        from app.core.policy import MappedPolicy
+
+        snapshot = PolicySnapshot(str(tmp_path / "policy.bin"))
+        rules = [(1, 1, 1, None, {"status": ["pending"]}, "read", "all", None)]
+
+        snapshot.write(Generation("a", 1), rules, ["orders"])
+        assert snapshot.generation() == ("a", 1)
+        previous = MappedPolicy(snapshot.view())
+
+        snapshot.write(Generation("a", 2), rules + [(2, 2, 1, 5, None, "read", "own", "orders")], ["orders"])
+        assert snapshot.generation() == ("a", 2)
+        data = snapshot.read()
+        assert len(data.rules) == 2
+        assert data.rules[0][4] == {"status": ["pending"]}
+
+        # Политика прежнего снимка продолжает отвечать после замены файла
+        assert [rule.id for rule in previous.get_rules(1, "orders", "read")] == [1]
+        assert not previous.get_rules(2, "orders", "read")
+
+
+    @pytest.mark.anyio
+    async def test_snapshot_from_other_epoch_rejected(self, db, tmp_path):
+        """Снимок прежнего экземпляра БД не используется даже с большим номером"""
+        snapshot = PolicySnapshot(str(tmp_path / "policy.bin"))
+        stale_rules = [(1, 4, 1, None, None, "read", "all", None)]
+        snapshot.write(Generation("previous-run", 50), stale_rules, ["orders"])
+
+        policy = await PolicyEngine(InProcessBus(), snapshot).get(db)
+
+        assert policy.epoch != "previous-run"
+        assert not policy.get_rules(4, "orders", "read")
+        # Снимок перестроен для текущей эпохи
+        assert snapshot.generation() == policy.generation
+
+    @pytest.mark.anyio
+    async def test_api_with_snapshot(self, tmp_path, monkeypatch, admin_token, guest_token):
+        """Проверки и изменения правил через API при политике из снимка"""
+        from app.core.policy import MappedPolicy, policy_engine
+
+        monkeypatch.setattr(policy_engine, "snapshot", PolicySnapshot(str(tmp_path / "policy.bin")))
+        policy_engine.invalidate()
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        guest_headers = {"Authorization": f"Bearer {guest_token}"}
+
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert isinstance(policy_engine._policy, MappedPolicy)
+
+        rule_data = {
+            "role_id": 4, "permission_id": 1, "resource_id": 2,
+            "conditions": {"status": ["pending"]}
+        }
+        response = client.post("/api/permission/rules", json=rule_data, headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_200_OK
+        assert {order["id"] for order in response.json()} == {1, 4}
+        assert client.get("/api/order/1", headers=guest_headers).status_code == status.HTTP_200_OK
+        assert client.get("/api/order/2", headers=guest_headers).status_code == status.HTTP_403_FORBIDDEN
+
+
+class TestFileBus:
+    """Тесты файловой шины инвалидации"""
+
+    @pytest.mark.anyio
+    async def test_publish_is_visible_to_other_workers(self, tmp_path):
+        """Версия, опубликованная одним воркером, видна другому"""
+        path = str(tmp_path / "policy_version")
+        writer = FileBus(path, poll_interval=0)
+        reader = FileBus(path, poll_interval=0)
+
+        assert reader.latest() == ("", 0)
+
+        writer.publish(Generation("a", 3))
+        assert reader.latest() == ("a", 3)
+
+        # Версия не уменьшается при запоздалой публикации
+        writer.publish(Generation("a", 2))
+        assert reader.latest() == ("a", 3)
+
+        # Новая эпоха заменяет прежнюю независимо от номера
+        writer.publish(Generation("b", 1))
+        assert reader.latest() == ("b", 1)
+
+    @pytest.mark.anyio
+    async def test_stale_bus_after_restart(self, db, tmp_path, monkeypatch):
+        """Шина от прежнего экземпляра БД не вызывает перезагрузку на каждый запрос"""
+        from app.core import policy as policy_module
+
+        path = str(tmp_path / "policy_version")
+        FileBus(path).publish(Generation("previous-run", 50))
+
+        loads = []
+        load_policy = policy_module.load_policy
+
+        async def counting_load_policy(session):
+            loads.append(1)
+            return await load_policy(session)
+
+        monkeypatch.setattr(policy_module, "load_policy", counting_load_policy)
+
+        engine = PolicyEngine(FileBus(path, poll_interval=0))
+        for _ in range(10):
+            policy = await engine.get(db)
+
+        assert len(loads) == 1
+        assert policy.version == 0 and policy.epoch != "previous-run"
+        assert FileBus(path).latest() == policy.generation
+
+    @pytest.mark.anyio
+    async def test_incomplete_bus_fails_on_creation(self):
+        """Шина без всех методов не создается"""
+        from app.core.policy_bus import InvalidationBus
+
+        class PublishOnlyBus(InvalidationBus):
+            def publish(self, version: int) -> None:
+                pass
+
+        with pytest.raises(TypeError):
+            PublishOnlyBus()
+
+
+class TestConditions:
+    """Тесты компиляции условий правил"""
+
+    @pytest.mark.anyio
+    async def test_operators(self):
+        """Поддерживаемые операторы условий"""
+        conditions = compile_conditions({
+            "min_price": 100,
+            "status": ["active", "pending"],
+            "owner_id": {"not_in": [1, 2]},
+            "quantity": {"range": [1, 10]},
+        })
+        obj = SimpleNamespace(price=150, status="active", owner_id=3, quantity=5)
+        assert conditions.check(obj)
+
+        assert not conditions.check(SimpleNamespace(price=50, status="active", owner_id=3, quantity=5))
+        assert not conditions.check(SimpleNamespace(price=150, status="done", owner_id=3, quantity=5))
+        assert not conditions.check(SimpleNamespace(price=150, status="active", owner_id=1, quantity=5))
+        assert not conditions.check(SimpleNamespace(price=150, status="active", owner_id=3, quantity=11))
+
+        # Отсутствующее поле и несравнимые типы - доступа нет
+        assert not conditions.check(SimpleNamespace(status="active", owner_id=3, quantity=5))
+        assert not conditions.check(SimpleNamespace(price="x", status="active", owner_id=3, quantity=5))
+
+    @pytest.mark.anyio
+    async def test_invalid_conditions(self):
+        """Некорректные условия отклоняются при компиляции"""
+        invalid = [
+            {"price": {"between": [1, 2]}},
+            {"price": {"range": [1]}},
+            {"status": {"in": "active"}},
+            {"price": {"gt": None}},
+            {"status": [["nested"]]},
+        ]
+        for conditions in invalid:
+            with pytest.raises(ValueError):
+                compile_conditions(conditions)
+
+    @pytest.mark.anyio
+    async def test_invalid_conditions_rejected_by_api(self, admin_token):
+        """API не создает правило с некорректными условиями"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+        rule_data = {
+            "role_id": 4, "permission_id": 1, "resource_id": 2,
+            "conditions": {"status": {"like": "pend%"}}
+        }
+        response = client.post("/api/permission/rules", json=rule_data, headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.anyio
+    async def test_unknown_condition_fields_rejected_by_api(self, admin_token):
+        """Поля условий правила с ресурсом проверяются по колонкам модели"""
+        headers = {"Authorization": f"Bearer {admin_token}"}
+
+        for conditions in ({"min_price": 100}, {"stauts": ["pending"]}):
+            rule_data = {"role_id": 4, "permission_id": 1, "resource_id": 2, "conditions": conditions}
+            response = client.post("/api/permission/rules", json=rule_data, headers=headers)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST, conditions
+
+        rule_data = {"role_id": 4, "permission_id": 1, "resource_id": 2, "conditions": {"status": ["pending"]}}
+        response = client.post("/api/permission/rules", json=rule_data, headers=headers)
+        assert response.status_code == status.HTTP_200_OK
+        rule_id = response.json()["id"]
+
+        response = client.put(
+            f"/api/permission/rules/{rule_id}", json={"conditions": {"price": {"gt": 1}}}, headers=headers
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = client.get(f"/api/permission/rules/{rule_id}", headers=headers)
+        assert response.json()["conditions"] == {"status": ["pending"]}
+
+    @pytest.mark.anyio
+    async def test_list_filter_matches_object_checks(self, admin_token, guest_token):
+        """Фильтр списка и проверка объекта дают одинаковый результат"""
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        guest_headers = {"Authorization": f"Bearer {guest_token}"}
+
+        # Гость может читать только заказы в статусе pending
+        rule_data = {
+            "role_id": 4, "permission_id": 1, "resource_id": 2,
+            "conditions": {"status": ["pending"]}
+        }
+        response = client.post("/api/permission/rules", json=rule_data, headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_200_OK
+        visible = {order["id"] for order in response.json()}
+        assert len(visible) == 2
+
+        for order_id in range(1, 5):
+            response = client.get(f"/api/order/{order_id}", headers=guest_headers)
+            if order_id in visible:
+                assert response.status_code == status.HTTP_200_OK
+                assert response.json()["status"] == "pending"
+            else:
+                assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    @pytest.mark.anyio
+    async def test_unbound_rule_conditions_match_object_checks(self, db, admin_token, guest_token):
+        """Условия правила без привязки к ресурсу действуют и в фильтре списка, и в проверке объекта"""
+        from sqlalchemy import select
+        from app.core.permissions import PermissionChecker
+        from app.core.principal import Principal
+        from app.models import Order
+
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        guest_headers = {"Authorization": f"Bearer {guest_token}"}
+
+        rule_data = {
+            "role_id": 4, "permission_id": 1, "resource_id": None,
+            "conditions": {"status": ["pending"]}
+        }
+        response = client.post("/api/permission/rules", json=rule_data, headers=admin_headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.get("/api/order/", headers=guest_headers)
+        assert response.status_code == status.HTTP_200_OK
+        visible = {order["id"] for order in response.json()}
+        assert visible == {1, 4}
+
+        for order_id in range(1, 5):
+            response = client.get(f"/api/order/{order_id}", headers=guest_headers)
+            assert (response.status_code == status.HTTP_200_OK) == (order_id in visible)
+
+        result = await db.execute(select(Order).order_by(Order.id))
+        orders = result.scalars().all()
+        checker = PermissionChecker(db, Principal(4, 4), "orders", "read")
+        assert await checker.check_many(orders) == [order.id in visible for order in orders]
+
+    @pytest.mark.anyio
+    async def test_mismatched_types_match_object_checks(self, admin_token, guest_token):
+        """Значения другого типа, чем у колонки, одинаково отклоняются в SQL и в предикате"""
+        admin_headers = {"Authorization": f"Bearer {admin_token}"}
+        guest_headers = {"Authorization": f"Bearer {guest_token}"}
+
+        cases = [
+            ({"status": {"gt": 5}}, set()),
+            ({"status": 5}, set()),
+            ({"status": [5, "pending"]}, {1, 4}),
+            ({"status": {"not_in": [5, "pending"]}}, {2, 3}),
+            ({"owner_id": {"range": ["1", "9"]}}, set()),
+        ]
+        for conditions, expected in cases:
+            rule_data = {
+                "role_id": 4, "permission_id": 1, "resource_id": 2, "conditions": conditions
+            }
+            response = client.post("/api/permission/rules", json=rule_data, headers=admin_headers)
+            assert response.status_code == status.HTTP_200_OK
+            rule_id = response.json()["id"]
+
+            response = client.get("/api/order/", headers=guest_headers)
+            assert response.status_code == status.HTTP_200_OK
+            visible = {order["id"] for order in response.json()}
+            assert visible == expected, conditions
+
+            for order_id in range(1, 5):
+                response = client.get(f"/api/order/{order_id}", headers=guest_headers)
+                assert (response.status_code == status.HTTP_200_OK) == (order_id in visible), conditions
+
+            client.delete(f"/api/permission/rules/{rule_id}", headers=admin_headers)
+
+    @pytest.mark.anyio
+    async def test_mismatched_types_not_sent_to_database(self):
+        """Значения другого типа не попадают в параметры SQL"""
+        from app.models import Order
+
+        clause = compile_conditions({"status": {"gt": 5}}).to_sql(Order)
+        assert str(clause.compile(compile_kwargs={"literal_binds": True})) == "false"
+
+        clause = compile_conditions({"status": [5, "pending"]}).to_sql(Order)
+        assert clause.compile().params == {"status_1": ["pending"]}